@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: local fuzzy element matching (trigram index vs brute-force scoring).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_element_matcher [dump.xml ...] [--repeat N]
+
+Pass hierarchy dumps recorded with d.dump_hierarchy(compressed=True). Without
+arguments a synthetic restaurant-list hierarchy is generated. Click targets
+are derived from the visible labels of each dump and perturbed the way LLM
+plans usually miss (case, a dropped letter, an XPath with the wrong class),
+then resolved back; "resolved" counts targets mapped to their source node.
+Labels that appear more than once on screen are ambiguous and skipped.
+"""
+import argparse
+import random
+import timeit
+from collections import Counter
+from source.filter_ui_elements import parse_ui_nodes
+from source.element_matcher import ElementIndex
+from benchmarks.bench_extract_ui_elements import synthetic_hierarchy
+
+def perturbed_targets(index, limit=200, seed=7):
+    """(target, expected node) pairs built from visible labels."""
+    rng = random.Random(seed)
+    counts = Counter(node.text or node.content_desc for node in index.nodes)
+    targets = []
+    for node in index.nodes:
+        label = node.text or node.content_desc
+        if not label or len(label) < 4 or counts[label] > 1:
+            continue
+        variants = [
+            f"text='{label.lower()}'",
+            f"xpath=//android.widget.Button[contains(@text, '{label}')]",
+        ]
+        cut = rng.randrange(1, len(label) - 1)
+        if not label[cut].isdigit():
+            variants.append(f"text='{label[:cut]}{label[cut + 1:]}'")
+        targets.extend((target, node) for target in variants)
+    rng.shuffle(targets)
+    return targets[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dumps", nargs="*", help="recorded hierarchy XML files")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = []
+    for path in args.dumps:
+        with open(path, "r", encoding="utf-8") as f:
+            samples.append((path, f.read()))
+    if not samples:
+        samples.append(("synthetic (400 cards)", synthetic_hierarchy()))
+
+    print(f"{'dump':<32} {'nodes':>6} {'targets':>8} {'index ms':>9} {'indexed ms':>11} "
+          f"{'brute ms':>9} {'resolved':>9} {'agree':>6}")
+    for name, xml_str in samples:
+        nodes = parse_ui_nodes(xml_str)
+        index = ElementIndex(nodes)
+        targets = perturbed_targets(index)
+        if not targets:
+            print(f"{name[-32:]:<32} {len(nodes):>6}  no labelled visible nodes")
+            continue
+
+        indexed = [index.best_match(target) for target, _ in targets]
+        brute = [index.best_match(target, candidates=index.nodes) for target, _ in targets]
+        resolved = sum(1 for match, (_, node) in zip(indexed, targets) if match and match.node is node)
+        agree = sum(1 for a, b in zip(indexed, brute) if (a and a.node) is (b and b.node))
+
+        index_ms = min(timeit.repeat(lambda: ElementIndex(nodes), number=1, repeat=args.repeat)) * 1000
+        indexed_ms = min(timeit.repeat(lambda: [index.best_match(t) for t, _ in targets],
+                                       number=1, repeat=args.repeat)) * 1000 / len(targets)
+        brute_ms = min(timeit.repeat(lambda: [index.best_match(t, candidates=index.nodes) for t, _ in targets],
+                                     number=1, repeat=args.repeat)) * 1000 / len(targets)
+        print(f"{name[-32:]:<32} {len(nodes):>6} {len(targets):>8} {index_ms:>9.2f} {indexed_ms:>11.3f} "
+              f"{brute_ms:>9.3f} {resolved / len(targets):>8.0%} {agree / len(targets):>6.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark: ElementTree-based vs streaming expat-based UI element extraction.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_extract_ui_elements [dump.xml ...] [--repeat N]
+
+Pass hierarchy dumps recorded with d.dump_hierarchy(compressed=True). Without
+arguments a synthetic restaurant-list hierarchy is generated.
+"""
+import argparse
+import timeit
+import tracemalloc
+import xml.etree.ElementTree as ET
+from source.filter_ui_elements import extract_ui_elements, extract_ui_element_records
+
+def legacy_extract_ui_elements(xml_str):
+    """The original ElementTree implementation, kept here as the baseline."""
+    root = ET.fromstring(xml_str)
+    elements = []
+    for node in root.iter("node"):
+        cls = node.attrib.get("class", "")
+        if not (node.attrib.get("clickable", "false") == "true"
+                or node.attrib.get("focusable", "false") == "true"
+                or "EditText" in cls
+                or node.attrib.get("checkable", "false") == "true"):
+            continue
+        elements.append({
+            "text": node.attrib.get("text", "").strip(),
+            "hint": node.attrib.get("hint", "").strip(),
+            "resource_id": node.attrib.get("resource-id", ""),
+            "class": node.attrib.get("class", ""),
+            "content_desc": node.attrib.get("content-desc", "").strip(),
+            "clickable": node.attrib.get("clickable", "false") == "true",
+            "focusable": node.attrib.get("focusable", "false") == "true",
+            "long_clickable": node.attrib.get("long-clickable", "false") == "true",
+            "enabled": node.attrib.get("enabled", "false") == "true",
+            "bounds": node.attrib.get("bounds", "")
+        })
+    return elements
+
+def synthetic_hierarchy(cards=400):
+    """Build a long list of restaurant cards, roughly shaped like a Zomato results screen."""
+    rows = []
+    for i in range(cards):
+        top = 300 + i * 420
+        rows.append(
+            f'<node index="{i}" text="" resource-id="com.application.zomato:id/card" class="android.view.ViewGroup" '
+            f'package="com.application.zomato" content-desc="" checkable="false" checked="false" clickable="true" '
+            f'enabled="true" focusable="true" focused="false" scrollable="false" long-clickable="false" '
+            f'password="false" selected="false" bounds="[0,{top}][1080,{top + 400}]">'
+            f'<node index="0" text="Restaurant {i}" resource-id="com.application.zomato:id/title" class="android.widget.TextView" '
+            f'package="com.application.zomato" content-desc="" checkable="false" checked="false" clickable="false" '
+            f'enabled="true" focusable="false" focused="false" scrollable="false" long-clickable="false" '
+            f'password="false" selected="false" bounds="[40,{top + 20}][700,{top + 80}]" />'
+            f'<node index="1" text="₹{200 + i} for one" resource-id="com.application.zomato:id/price" class="android.widget.TextView" '
+            f'package="com.application.zomato" content-desc="" checkable="false" checked="false" clickable="false" '
+            f'enabled="true" focusable="false" focused="false" scrollable="false" long-clickable="false" '
+            f'password="false" selected="false" bounds="[40,{top + 90}][500,{top + 140}]" />'
+            f'<node index="2" text="" resource-id="com.application.zomato:id/bookmark" class="android.widget.ImageView" '
+            f'package="com.application.zomato" content-desc="Bookmark" checkable="true" checked="false" clickable="true" '
+            f'enabled="true" focusable="true" focused="false" scrollable="false" long-clickable="false" '
+            f'password="false" selected="false" bounds="[960,{top + 20}][1040,{top + 100}]" />'
+            f'</node>'
+        )
+    return (
+        "<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">"
+        '<node index="0" text="" resource-id="" class="android.widget.FrameLayout" package="com.application.zomato" '
+        'content-desc="" checkable="false" checked="false" clickable="false" enabled="true" focusable="false" '
+        'focused="false" scrollable="true" long-clickable="false" password="false" selected="false" '
+        'bounds="[0,0][1080,2400]">' + "".join(rows) + "</node></hierarchy>"
+    )
+
+def peak_memory_kb(fn):
+    """Peak Python heap allocation while running fn once."""
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dumps", nargs="*", help="recorded hierarchy XML files")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    samples = []
+    for path in args.dumps:
+        with open(path, "r", encoding="utf-8") as f:
+            samples.append((path, f.read()))
+    if not samples:
+        samples.append(("synthetic (400 cards)", synthetic_hierarchy()))
+
+    print(f"{'dump':<32} {'KB':>7} {'elements':>9} {'legacy ms':>10} {'dicts ms':>9} {'records ms':>11} "
+          f"{'legacy peak KB':>15} {'records peak KB':>16}")
+    for name, xml_str in samples:
+        legacy = legacy_extract_ui_elements(xml_str)
+        assert legacy == extract_ui_elements(xml_str), f"{name}: streaming output differs from legacy"
+
+        legacy_ms = min(timeit.repeat(lambda: legacy_extract_ui_elements(xml_str), number=1, repeat=args.repeat)) * 1000
+        dicts_ms = min(timeit.repeat(lambda: extract_ui_elements(xml_str), number=1, repeat=args.repeat)) * 1000
+        records_ms = min(timeit.repeat(lambda: extract_ui_element_records(xml_str), number=1, repeat=args.repeat)) * 1000
+        legacy_peak = peak_memory_kb(lambda: legacy_extract_ui_elements(xml_str))
+        records_peak = peak_memory_kb(lambda: extract_ui_element_records(xml_str))
+        print(f"{name[-32:]:<32} {len(xml_str) / 1024:>7.1f} {len(legacy):>9} {legacy_ms:>10.2f} "
+              f"{dicts_ms:>9.2f} {records_ms:>11.2f} {legacy_peak:>15.0f} {records_peak:>16.0f}")
+
+if __name__ == "__main__":
+    main()
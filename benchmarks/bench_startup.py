@@ -0,0 +1,84 @@
+"""
+Startup guard: cold import cost of the CLI entry points, measured with -X importtime.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup [module ...] [--repeat N] [--budget-ms MS]
+
+Each module (default: source.executor and source.batch_runner) is imported in
+a fresh interpreter whose working directory is an empty temp dir. The check
+fails (exit status 1) when:
+  - the best cumulative import time exceeds the budget,
+  - a heavy dependency (openai, httpx, uiautomator2, Pillow, lxml, tiktoken)
+    is imported eagerly, or
+  - importing creates files (e.g. logs/) in the working directory.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ("openai", "httpx", "uiautomator2", "adbutils", "PIL", "lxml", "tiktoken")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into [(module, self_us, cumulative_us)] in report order."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        rows.append((name, int(self_us), int(cumulative_us)))
+    return rows
+
+def measure(module):
+    """Import module in a fresh interpreter; return (rows, files created in its working directory)."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=cwd, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        created = sorted(os.listdir(cwd))
+    return parse_importtime(result.stderr), created
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["source.executor", "source.batch_runner"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=250.0)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list (by self time)")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.repeat)]
+        timings = [(next((c for name, _, c in rows if name == module), 0), rows, created) for rows, created in runs]
+        best_us, rows, created = min(timings, key=lambda item: item[0])
+
+        print(f"\n{module}: best {best_us / 1000:.1f} ms over {args.repeat} runs "
+              f"(median {sorted(t[0] for t in timings)[len(timings) // 2] / 1000:.1f} ms, budget {args.budget_ms:.0f} ms)")
+        print(f"  {'module':<48} {'self ms':>8} {'cumul ms':>9}")
+        for name, self_us, cumulative_us in sorted(rows, key=lambda row: -row[1])[:args.top]:
+            print(f"  {name.strip()[:48]:<48} {self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}")
+
+        heavy = sorted({name.strip() for name, _, _ in rows if name.strip().split(".")[0] in HEAVY_MODULES})
+        if best_us / 1000 > args.budget_ms:
+            failures.append(f"{module}: {best_us / 1000:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        if heavy:
+            failures.append(f"{module}: eagerly imports {', '.join(heavy[:8])}")
+        if created:
+            failures.append(f"{module}: import created {', '.join(created)} in the working directory")
+
+    print()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("OK startup within budget, no heavy imports, no import side effects")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
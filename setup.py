@@ -21,6 +21,6 @@ name='android-testing',
 version='0.0.1',
 author='Vidushee Geetam',
 author_email='vidusheegeetam@gmail.com',
-packages=find_packages(),
+packages=find_packages(exclude=["tests", "tests.*"]),
 install_requires=get_requirements('requirements.txt')
 )
\ No newline at end of file
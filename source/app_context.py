@@ -0,0 +1,198 @@
+import os
+import threading
+from dataclasses import dataclass
+from source.logger import logger
+from source.tracing import span
+
+# === Prompt Templates ===
+# Each call type has a static part (instructions + app context) and a dynamic part.
+# The static part becomes the system message and is rendered once per app context,
+# so every request for the same app starts with a byte-identical prefix that the
+# provider's prompt cache can reuse. Per-call data (user request, UI elements,
+# failed step) only ever goes into the dynamic part, which follows it.
+_TEMPLATES = {
+    "plan": ("""
+You are a mobile automation planner. The following is a basic flow overview of how major functions work in the app:
+{app_context}
+
+ALWAYS generate a step-by-step plan for navigating the app using uiautomator2 to achieve what the user is asking for.
+If you can't complete the plan, generate a fallback plan that will help the user to complete the task or give them information closest to what they are asking for.
+BUT **ALWAYS** GENERATE A PLAN.
+
+Each step should be:
+- Directly mappable to uiautomator2 methods
+- Written in JSON format like:
+[
+  {{ "action": "click", "target": "xpath=//android.widget.TextView[contains(@text, 'Search')]" }},
+  {{ "action": "type", "value": "Wireless Headphones" }},
+  {{ "action": "click", "target": "xpath=//android.widget.TextView[contains(@text, 'Wireless Headphones')]" }},
+  {{ "action": "wait", "target": "xpath=//android.widget.TextView[contains(@text, '$')]" }},
+  {{ "action": "extract", "query": "find the price of Wireless Headphones" }}
+]
+
+IMPORTANT: For extraction steps, use "query" field with natural language instead of "target" with XPath. The extraction will use screenshot analysis with scrolling to find the information.
+
+Valid actions: "click", "type", "wait", "extract"
+For extract: use "query" field with natural language description of what to find
+
+Only output valid JSON array — no markdown or explanations.
+""", "{ui_elements}{user_request}"),
+
+    "extract": ("""You are a mobile automation assistant. Extract only the requested information from the screenshot.
+
+App Context:
+{app_context}
+
+Extract the most relevant information from the screenshot to fulfill the user's request.
+Look for prices, times, availability or any information that matches what the user is asking for.
+
+IMPORTANT: You must respond with a JSON object in this exact format:
+{{"answer": "extracted value or NOT_FOUND", "found": true/false}}
+
+Set "found" to true only if you found the specific information the user is asking for. Set "found" to false if the information is not visible or not what the user requested.""",
+                "This is a screenshot of the mobile app. The user request is: '{user_request}'."),
+
+    "extract_text": ("""You are a mobile automation assistant. Extract only the requested information from the text of the app's screen.
+
+App Context:
+{app_context}
+
+The screen text comes from the accessibility hierarchy, one visual row per line with its cells separated by " | ".
+Rows from further down the page follow after scrolling. Answer only from this text; do not guess values that are not in it.
+
+IMPORTANT: You must respond with a JSON object in this exact format:
+{{"answer": "extracted value or NOT_FOUND", "found": true/false}}
+
+Set "found" to true only if the text contains the specific information the user is asking for.""",
+                     "The user request is: '{user_request}'.\n\nScreen text:\n{rows}"),
+
+    "action": ("""You are a mobile automation assistant. You must return ONLY a valid JSON object with action, target/value, and found fields. No explanations.
+
+App Context:
+{app_context}
+
+You will get a screenshot of the mobile app taken after the automation failed to find or interact with the expected element.
+Based on the screenshot and app context, what is the next UI action needed to progress toward the user's goal?
+
+You must respond with a SINGLE JSON object in this exact format. Following is just an example, your answer should be in accordance with the query and app context:
+
+{{ "action": "click", "target": "text='Button Text'", "found": true }}
+OR
+{{ "action": "click", "target": "xpath=//android.widget.TextView[contains(@text, 'Partial Text')]", "found": true }}
+OR
+{{ "action": "type", "value": "text to type", "found": true }}
+OR
+{{ "action": "extract", "target": "xpath=//android.widget.TextView[contains(@text, '$')]", "found": true }}
+
+Valid actions: "click", "type", "wait", "extract"
+Valid targets: "text='exact text'", "xpath=//path/to/element"
+For typing: use "value" field instead of "target"
+For extract: use "target" field with xpath to find elements to extract text from
+
+IMPORTANT: Set "found" to true only if you can see a clear, actionable element in the screenshot. Set "found" to false if no suitable element is visible.
+
+Only return the JSON object - no explanations or markdown formatting.""",
+               "User Request: '{user_request}'{failure_context}{ui_elements}"),
+
+    "repair": ("""
+You repair uiautomator2 automation plans. Each step is one of:
+  {{ "action": "click", "target": "text='...'" or "xpath=..." }}
+  {{ "action": "type", "value": "..." }}
+  {{ "action": "wait", "target": "xpath=..." }}
+  {{ "action": "extract", "query": "natural language description" }}
+Fix only the flagged steps; keep every other step unchanged and in order.
+Targets of steps on the current screen must match one of its elements.
+
+App flow overview:
+{app_context}
+
+Only output the full corrected plan as a valid JSON array — no markdown or explanations.
+""", "{ui_elements}User request: {user_request}\n\nPlan:\n{plan}\n\nProblems:\n{problems}"),
+}
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """Precompiled prompt for one (app, call type): static system prefix plus a dynamic format"""
+    kind: str
+    system: str
+    dynamic: str
+
+    def render(self, **fields):
+        """Fill in the per-call part; the system prefix is never touched."""
+        return self.dynamic.format(**fields)
+
+    def messages(self, **fields):
+        """Text-only chat messages: static system prefix first, per-call content after."""
+        return [
+            { "role": "system", "content": self.system },
+            { "role": "user", "content": self.render(**fields) }
+        ]
+
+# === Registry ===
+class AppContext:
+    """One loaded app context file and the templates compiled from it"""
+    __slots__ = ("path", "text", "version", "templates")
+
+    def __init__(self, path, text, version):
+        self.path = path
+        self.text = text
+        self.version = version  # (mtime_ns, size) of the file when it was read
+        self.templates = {}
+
+class AppContextRegistry:
+    """Loads each app context file once and recompiles its templates when the file changes.
+
+    Every lookup costs one os.stat(); the file is only re-read when its mtime or
+    size differs from the version that was loaded.
+    """
+
+    def __init__(self):
+        self._contexts = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, path):
+        """Return the AppContext for path, reloading it if the file changed on disk."""
+        with span("cache.app_context") as s:
+            try:
+                stat = os.stat(path)
+            except (OSError, TypeError) as e:
+                logger.warning(f"⚠️ Could not read app context {path}: {e}")
+                s.set(cache="miss")
+                return AppContext(path, "", None)
+            version = (stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                context = self._contexts.get(path)
+                if context is not None and context.version == version:
+                    s.set(cache="hit")
+                    return context
+            s.set(cache="miss")
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read app context {path}: {e}")
+                return AppContext(path, "", None)
+            context = AppContext(path, text, version)
+            with self._lock:
+                self._contexts[path] = context
+                self.loads += 1
+            logger.debug(f"📄 Loaded app context {path} ({len(text)} chars)")
+            return context
+
+    def template(self, path, kind):
+        """Return the precompiled template of one call type for an app context file."""
+        context = self.get(path)
+        template = context.templates.get(kind)
+        if template is None:
+            static, dynamic = _TEMPLATES[kind]
+            template = PromptTemplate(kind, static.format(app_context=context.text), dynamic)
+            context.templates[kind] = template
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._contexts.clear()
+
+# Process-wide registry shared by planning, fallbacks and plan repair
+app_contexts = AppContextRegistry()
@@ -0,0 +1,194 @@
+"""
+Batch runner: shard a suite of (app, prompt, expected) cases across connected devices.
+
+Usage:
+    python -m source.batch_runner suite.jsonl [--serials SERIAL ...]
+
+The suite is a JSON array or JSON-lines file of objects with "app", "prompt"
+and optional "expected" / "name" keys. Without --serials every device reported
+by adb is used.
+"""
+import argparse
+import json
+import queue
+import re
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+from source.logger import logger
+from source.config import APP_CONTEXT_FILES
+from source.device_manager import connect_to_device
+from source.executor import run_automation
+from source.memory_state import RunContext, use_context
+
+@dataclass
+class TestCase:
+    """One suite entry"""
+    app: str
+    prompt: str
+    expected: Optional[str] = None
+    name: Optional[str] = None
+
+@dataclass
+class CaseResult:
+    """Outcome of running one case on one device"""
+    case: TestCase
+    serial: Optional[str]
+    result: Optional[str] = None
+    passed: bool = False
+    latency: float = 0.0
+    error: Optional[str] = None
+
+@dataclass
+class SuiteReport:
+    """Per-case results plus aggregate timing for a suite run"""
+    results: List[CaseResult] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    @property
+    def passed(self):
+        return sum(1 for r in self.results if r.passed)
+
+    @property
+    def throughput(self):
+        """Completed cases per minute."""
+        return len(self.results) / self.wall_time * 60 if self.wall_time else 0.0
+
+def load_suite(path):
+    """Load test cases from a JSON array or JSON-lines file."""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        entries = json.loads(content)
+    else:
+        entries = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    cases = []
+    for entry in entries:
+        app = entry["app"].strip().lower()
+        if app not in APP_CONTEXT_FILES:
+            raise ValueError(f"Unknown app '{app}' in suite {path}")
+        cases.append(TestCase(app, entry["prompt"], entry.get("expected"), entry.get("name")))
+    return cases
+
+def result_matches(result, expected):
+    """Check a result against the expectation ("re:" prefix for a regex, otherwise a substring)."""
+    if result is None:
+        return False
+    if expected is None:
+        return True
+    if expected.startswith("re:"):
+        return re.search(expected[3:], str(result), re.IGNORECASE) is not None
+    return expected.lower() in str(result).lower()
+
+def _worker(serial, cases, results, results_lock, connect, run_case):
+    """Connect to one device and run cases from the shared queue until it is empty."""
+    try:
+        d = connect(serial)
+    except Exception as e:
+        logger.error(f"❌ Could not connect to device {serial}: {e}")
+        return
+
+    while True:
+        try:
+            case = cases.get_nowait()
+        except queue.Empty:
+            return
+
+        label = case.name or case.prompt
+        logger.info(f"🧪 [{serial}] Running: {label}")
+        outcome = CaseResult(case=case, serial=serial)
+        start = time.perf_counter()
+        try:
+            # Each case gets its own isolated run context, also bound for legacy memory_state readers
+            ctx = RunContext()
+            with use_context(ctx):
+                outcome.result = run_case(d, case.app, case.prompt, ctx)
+            outcome.passed = result_matches(outcome.result, case.expected)
+        except Exception as e:
+            outcome.error = f"{type(e).__name__}: {e}"
+            logger.error(f"❌ [{serial}] Case failed with error: {outcome.error}")
+        outcome.latency = time.perf_counter() - start
+
+        with results_lock:
+            results.append(outcome)
+        logger.info(f"{'✅' if outcome.passed else '❌'} [{serial}] {label} → {outcome.result} ({outcome.latency:.1f}s)")
+
+def run_suite(cases, serials, connect=connect_to_device, run_case=None):
+    """
+    Run cases across devices, one worker thread per serial pulling from a shared queue.
+    Args:
+        cases: list of TestCase
+        serials: device serials to shard across
+        connect: callable returning a device for a serial (inject fakes here)
+        run_case: callable (d, app, prompt, ctx) -> result; defaults to executor.run_automation
+    Returns:
+        SuiteReport with results in suite order
+    """
+    if run_case is None:
+        run_case = lambda d, app, prompt, ctx: run_automation(d, app, prompt, verbose=False, ctx=ctx)
+
+    pending = queue.Queue()
+    for case in cases:
+        pending.put(case)
+
+    results = []
+    results_lock = threading.Lock()
+    start = time.perf_counter()
+    workers = [
+        threading.Thread(target=_worker, args=(serial, pending, results, results_lock, connect, run_case),
+                         name=f"device-{serial}", daemon=True)
+        for serial in serials
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # Cases left over when every device failed to connect
+    while not pending.empty():
+        results.append(CaseResult(case=pending.get_nowait(), serial=None, error="No device available"))
+
+    order = {id(case): i for i, case in enumerate(cases)}
+    results.sort(key=lambda r: order[id(r.case)])
+    return SuiteReport(results=results, wall_time=time.perf_counter() - start)
+
+def format_report(report):
+    """Render per-case latencies and aggregate throughput as a text table."""
+    lines = [f"{'case':<40} {'device':<16} {'status':<6} {'latency':>8}  result"]
+    for r in report.results:
+        status = "PASS" if r.passed else ("ERROR" if r.error else "FAIL")
+        label = (r.case.name or r.case.prompt)[:40]
+        lines.append(f"{label:<40} {(r.serial or '-'):<16} {status:<6} {r.latency:>7.1f}s  {r.error or r.result}")
+
+    latencies = [r.latency for r in report.results if r.serial]
+    lines.append("")
+    lines.append(f"Cases: {len(report.results)}  Passed: {report.passed}  Wall time: {report.wall_time:.1f}s  "
+                 f"Throughput: {report.throughput:.2f} cases/min")
+    if latencies:
+        p95 = sorted(latencies)[max(0, round(len(latencies) * 0.95) - 1)]
+        lines.append(f"Latency mean: {statistics.mean(latencies):.1f}s  p50: {statistics.median(latencies):.1f}s  p95: {p95:.1f}s")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("suite", help="JSON or JSON-lines suite file")
+    parser.add_argument("--serials", nargs="+", help="device serials (default: all adb devices)")
+    args = parser.parse_args()
+
+    serials = args.serials
+    if not serials:
+        from adbutils import adb
+        serials = [device.serial for device in adb.device_list()]
+    if not serials:
+        parser.error("No connected devices found")
+
+    cases = load_suite(args.suite)
+    logger.info(f"🧪 Running {len(cases)} cases on {len(serials)} device(s): {', '.join(serials)}")
+    report = run_suite(cases, serials)
+    print(format_report(report))
+
+if __name__ == "__main__":
+    main()
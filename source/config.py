@@ -1,10 +1,35 @@
 import os
-import openai
-from dotenv import load_dotenv
 
-# === Setup ===
-load_dotenv(override=True)
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# === Environment ===
+# Importing this module has no side effects: .env is parsed into a private dict
+# (python-dotenv is only imported when a .env file exists) and os.environ is untouched.
+_dotenv_values = None
+
+def _find_dotenv():
+    """Nearest .env walking up from this package, like load_dotenv() did."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        candidate = os.path.join(directory, ".env")
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+def env(name, default=None):
+    """Read a setting from .env (which overrides the process environment) or the environment."""
+    global _dotenv_values
+    if _dotenv_values is None:
+        path = _find_dotenv()
+        if path:
+            from dotenv import dotenv_values
+            _dotenv_values = {key: value for key, value in dotenv_values(path).items() if value is not None}
+        else:
+            _dotenv_values = {}
+    return _dotenv_values.get(name, os.environ.get(name, default))
+
+OPENAI_API_KEY = env("OPENAI_API_KEY")
 
 # === App Configuration ===
 UBER_PACKAGE = "com.ubercab"
@@ -25,4 +50,128 @@ APPS_WITH_UI_ELEMENTS = {
 
 def get_ui_elements_setting(app_choice):
     """Get whether UI elements should be used for a specific app."""
-    return APPS_WITH_UI_ELEMENTS.get(app_choice, False) 
\ No newline at end of file
+    return APPS_WITH_UI_ELEMENTS.get(app_choice, False) 
+
+# === UI Idle Detection ===
+# Per call site: (upper bound in seconds, consecutive identical polls needed to call the UI settled)
+IDLE_SETTINGS = {
+    "launch": (8.0, 3),
+    "extract": (5.0, 3),
+    "scroll": (2.0, 2),
+    "step": (1.5, 2),  # screen reached by a click/type, before the screen graph records it
+}
+IDLE_POLL_INTERVAL = 0.3
+# Mean absolute pixel difference (0-255) tolerated between screenshot thumbnails
+IDLE_SCREENSHOT_TOLERANCE = 2.0
+
+# === Plan Cache ===
+PLAN_MODEL = "gpt-4o"
+PLAN_CACHE_DIR = "cache/plans"
+PLAN_CACHE_TTL = 7 * 24 * 3600  # seconds; None keeps entries until evicted
+PLAN_CACHE_MAX_ENTRIES = 500
+# Set PLAN_CACHE_BYPASS=1 to skip cache lookups (fresh plans are still stored)
+PLAN_CACHE_BYPASS = env("PLAN_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+# === Screenshot Dedup ===
+# Frames are compared by a FRAME_HASH_SIZE x FRAME_HASH_SIZE difference hash of the screen
+# below the status bar (top FRAME_HASH_SKIP_TOP of the height, where the clock and battery live)
+FRAME_HASH_SIZE = 16
+FRAME_HASH_SKIP_TOP = 0.04
+# Max Hamming distance (out of 256 bits) for two frames to count as the same screen
+FRAME_DUPLICATE_THRESHOLD = 6
+# Number of (query, frame key) extraction answers kept in memory
+FRAME_ANSWER_CACHE_SIZE = 256
+
+# === Screenshots ===
+# Save captured screenshots to screenshots/ on a background thread (for debugging)
+SCREENSHOT_PERSIST = env("SCREENSHOT_PERSIST", "1").lower() in ("1", "true", "yes")
+
+# === Vision Preprocessing ===
+# Screenshots are downscaled and re-encoded before every vision call
+VISION_MAX_LONG_EDGE = 1280
+VISION_IMAGE_FORMAT = "JPEG"  # "JPEG", "WEBP" or "PNG"
+VISION_IMAGE_QUALITY = 80
+VISION_DETAIL = "high"
+# Crop extraction screenshots to the largest scrollable container
+VISION_CROP_TO_SCROLLABLE = False
+
+# === Hierarchy Snapshots ===
+# Number of parsed hierarchy dumps kept per run for diffing
+HIERARCHY_SNAPSHOT_LIMIT = 20
+
+# === UI Element Prompt Encoding ===
+# Token budget for the UI element block embedded in planning/fallback prompts
+UI_PROMPT_TOKEN_BUDGET = 1500
+UI_PROMPT_INCLUDE_BOUNDS = False
+
+# === LLM Client ===
+# Point OPENAI_BASE_URL at a local stub server to run without the real API
+OPENAI_BASE_URL = env("OPENAI_BASE_URL") or None
+LLM_TIMEOUT = 60.0  # seconds per request
+LLM_MAX_RETRIES = 3
+LLM_BACKOFF_BASE = 0.5  # seconds; doubled per attempt with full jitter
+LLM_BACKOFF_MAX = 8.0
+LLM_MAX_CONNECTIONS = 10
+
+# === Parallel Extraction Fallback ===
+# Capture all scroll frames up front and send the vision requests concurrently.
+# Cuts worst-case latency at the cost of extra vision calls on frames past the answer.
+FALLBACK_PARALLEL_FRAMES = env("FALLBACK_PARALLEL_FRAMES", "").lower() in ("1", "true", "yes")
+FALLBACK_PARALLEL_WORKERS = 5
+
+# === Learned Locators ===
+# Selectors that resolved a failed click, reused on the next run before any LLM call
+LOCATOR_CACHE_PATH = "cache/locators.json"
+# Consecutive failures after which a learned selector is dropped
+LOCATOR_MAX_FAILURES = 2
+
+# === Screen Graph ===
+# Record (screen, action, screen) transitions per app and replay known routes without LLM planning
+SCREEN_GRAPH_ENABLED = True
+SCREEN_GRAPH_DIR = "cache/screen_graphs"
+
+# === Local Element Matcher ===
+# Minimum fuzzy-match score (0-1) for clicking a local candidate instead of asking the LLM
+ELEMENT_MATCH_MIN_SCORE = 0.8
+# Candidates taken from the trigram index before full scoring
+ELEMENT_MATCH_CANDIDATES = 25
+
+# === Local XPath Engine ===
+# Parsed hierarchy dumps kept for local XPath evaluation (most recent first)
+XPATH_DOCUMENT_CACHE_SIZE = 8
+
+# === Plan Validation ===
+# Check plans before execution (schemas, XPath syntax, first-screen targets) and batch-repair issues
+PLAN_VALIDATION_ENABLED = True
+
+# === Text-First Extraction ===
+# Answer extract steps from hierarchy text (patterns, proximity, text-only LLM) before screenshots and vision
+TEXT_EXTRACT_ENABLED = True
+TEXT_EXTRACT_MODEL = "gpt-4o-mini"
+# Extra dumps taken while scrolling the results before escalating (the page is scrolled back afterwards)
+TEXT_EXTRACT_MAX_SCROLLS = 3
+# Minimum similarity (0-1) between the query subject and a value's surrounding text
+TEXT_EXTRACT_MIN_SCORE = 0.75
+# Screen text rows sent to the text-only model
+TEXT_EXTRACT_MAX_ROWS = 150
+
+# === Scroll Planner ===
+# Swipes run inside the largest scrollable container, from/to these fractions of its height
+SCROLL_SWIPE_FROM = 0.75
+SCROLL_SWIPE_TO = 0.25
+SCROLL_SWIPE_DURATION = 0.8  # seconds
+# Scrollable containers shorter than this fraction of the screen (e.g. carousels) are not swiped
+SCROLL_MIN_CONTAINER_HEIGHT = 0.2
+
+# === Tracing ===
+# Set TRACE_ENABLED=1 to append timed spans (device actions, dumps, screenshots, LLM calls)
+# as JSON lines; they are written on the log listener thread and rotate like the log file
+TRACE_ENABLED = env("TRACE_ENABLED", "").lower() in ("1", "true", "yes")
+TRACE_PATH = "logs/trace.jsonl"
+
+# === Logging ===
+LOG_PATH = "logs/agent.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # rotate the log file at 10 MB
+LOG_BACKUP_COUNT = 5
+# Set LOG_JSONL to a path (e.g. logs/agent.jsonl) to also write compact JSON-lines records
+LOG_JSONL_PATH = env("LOG_JSONL") or None
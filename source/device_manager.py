@@ -1,14 +1,17 @@
-import uiautomator2 as u2
-import time
 from source.logger import logger
+from source.ui_idle import wait_for_idle
 
-def connect_to_device():
-    """Connect to the Android device using uiautomator2."""
-    logger.info("🔌 Connecting to device...")
-    return u2.connect()
+def connect_to_device(serial=None):
+    """Connect to the Android device using uiautomator2 (the only device if no serial is given)."""
+    import uiautomator2 as u2  # deferred: only needed once a device is actually used
+    logger.info(f"🔌 Connecting to device{f' {serial}' if serial else ''}...")
+    return u2.connect(serial)
 
 def launch_app(d, package_name):
-    """Launch the specified app on the device."""
+    """Launch the specified app and wait for its first screen to settle.
+
+    Returns the settled hierarchy XML, or None if the app did not settle in time.
+    """
     logger.info(f"🚀 Launching {package_name}...")
     d.app_start(package_name)
-    time.sleep(5) 
\ No newline at end of file
+    return wait_for_idle(d, site="launch", require=lambda xml: f'package="{package_name}"' in xml)
\ No newline at end of file
@@ -0,0 +1,185 @@
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Optional
+from source.config import ELEMENT_MATCH_MIN_SCORE, ELEMENT_MATCH_CANDIDATES
+from source.filter_ui_elements import UIElement
+
+_TEXT_RE = re.compile(r"text=['\"]?([^'\"]+)['\"]?$")
+_XPATH_CLASS_RE = re.compile(r"//([\w.]+)\s*\[")
+_XPATH_VALUE_RE = re.compile(r"@(text|content-desc|hint|resource-id)\s*[,=]\s*['\"]([^'\"]+)['\"]")
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+# === Text Similarity ===
+def normalize(text):
+    """Lowercase and reduce to alphanumeric tokens (underscores and punctuation split words)."""
+    return " ".join(_TOKEN_RE.findall((text or "").lower()))
+
+def _ratio(a, b):
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+def token_set_ratio(a, b):
+    """Order- and duplicate-insensitive similarity of two strings in [0, 1].
+
+    Compares the shared tokens against each side's full token set, so a target
+    that is a subset of a longer label ("Search" vs "Search for restaurants")
+    still scores high.
+    """
+    tokens_a, tokens_b = set(normalize(a).split()), set(normalize(b).split())
+    if not tokens_a or not tokens_b:
+        return 0.0
+    common = " ".join(sorted(tokens_a & tokens_b))
+    rest_a = " ".join(sorted(tokens_a - tokens_b))
+    rest_b = " ".join(sorted(tokens_b - tokens_a))
+    full_a = f"{common} {rest_a}".strip()
+    full_b = f"{common} {rest_b}".strip()
+    return max(_ratio(common, full_a), _ratio(common, full_b), _ratio(full_a, full_b))
+
+def text_similarity(wanted, label):
+    """Similarity of a wanted label to a node label, strict about numbers.
+
+    The subset-friendly token-set ratio only applies when every wanted token is
+    present in the label; otherwise the sorted token strings are compared as a
+    whole. A wanted number missing from the label ("Table 1" vs "Table 12")
+    scores 0.
+    """
+    wanted_tokens, label_tokens = set(normalize(wanted).split()), set(normalize(label).split())
+    if not wanted_tokens or not label_tokens:
+        return 0.0
+    missing = wanted_tokens - label_tokens
+    if any(token.isdigit() for token in missing):
+        return 0.0
+    if not missing:
+        return token_set_ratio(wanted, label)
+    return _ratio(" ".join(sorted(wanted_tokens)), " ".join(sorted(label_tokens)))
+
+def trigrams(text):
+    """Character trigrams of a normalized string, padded so short words still index."""
+    padded = f"  {normalize(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# === Target Parsing ===
+def parse_target(target):
+    """Pull the label and widget class a click target is looking for.
+
+    Handles "text='...'" targets and XPath predicates on @text, @content-desc,
+    @hint and @resource-id. Returns (label, class_name); either may be None.
+    """
+    if not target:
+        return None, None
+    if target.startswith("text="):
+        match = _TEXT_RE.match(target)
+        return (match.group(1) if match else None), None
+    if target.startswith("xpath="):
+        xpath = target[len("xpath="):]
+        class_match = _XPATH_CLASS_RE.search(xpath)
+        pairs = _XPATH_VALUE_RE.findall(xpath)
+        values = [value for attr, value in pairs if attr != "resource-id"]
+        if not values:
+            # Fall back to the id name, e.g. "id/search_bar" -> "search bar"
+            values = [value.rsplit("/", 1)[-1].replace("_", " ") for attr, value in pairs]
+        return (" ".join(values) or None), (class_match.group(1) if class_match else None)
+    return None, None
+
+def _labels(node):
+    labels = [node.text, node.content_desc, node.hint]
+    if node.resource_id:
+        labels.append(node.resource_id.rsplit("/", 1)[-1].replace("_", " "))
+    return [label for label in labels if label]
+
+def class_compatibility(wanted, actual):
+    """1.0 for the same class, 0.5 for the same widget family (e.g. Button/ImageButton), else 0."""
+    if not wanted:
+        return 1.0
+    if wanted == actual:
+        return 1.0
+    wanted_short, actual_short = wanted.rsplit(".", 1)[-1], actual.rsplit(".", 1)[-1]
+    for family in ("Button", "Text", "Image", "Layout", "View"):
+        if family in wanted_short and family in actual_short:
+            return 0.5
+    return 0.0
+
+def is_visible(node, screen):
+    """A node is visible when it has a non-empty area and its centre is on screen."""
+    if not node.bounds:
+        return False
+    x1, y1, x2, y2 = node.bounds
+    if x2 <= x1 or y2 <= y1:
+        return False
+    if screen is None:
+        return True
+    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+    sx1, sy1, sx2, sy2 = screen
+    return sx1 <= cx < sx2 and sy1 <= cy < sy2
+
+# === Matching ===
+@dataclass
+class ElementMatch:
+    """Best local candidate for a click target"""
+    node: UIElement
+    score: float
+    text_score: float
+
+    @property
+    def center(self):
+        x1, y1, x2, y2 = self.node.bounds
+        return (x1 + x2) // 2, (y1 + y2) // 2
+
+class ElementIndex:
+    """Trigram index over the labelled, visible nodes of one hierarchy snapshot."""
+
+    def __init__(self, nodes):
+        self.screen = next((node.bounds for node in nodes if node.bounds), None)
+        self.nodes = [node for node in nodes if node.enabled and _labels(node) and is_visible(node, self.screen)]
+        self._postings = defaultdict(list)
+        for position, node in enumerate(self.nodes):
+            grams = set()
+            for label in _labels(node):
+                grams |= trigrams(label)
+            for gram in grams:
+                self._postings[gram].append(position)
+
+    def candidates(self, label, limit=ELEMENT_MATCH_CANDIDATES):
+        """Nodes sharing the most trigrams with label, best first."""
+        counts = Counter()
+        for gram in trigrams(label):
+            counts.update(self._postings.get(gram, ()))
+        return [self.nodes[position] for position, _ in counts.most_common(limit)]
+
+    def score(self, node, label, class_name):
+        text_score = max(text_similarity(label, node_label) for node_label in _labels(node))
+        score = (0.8 * text_score
+                 + 0.1 * class_compatibility(class_name, node.class_name)
+                 + (0.1 if node.actionable else 0.0))
+        return ElementMatch(node, score, text_score)
+
+    def best_match(self, target, min_score=ELEMENT_MATCH_MIN_SCORE, candidates=None):
+        """Return the best-scoring ElementMatch for a click target, or None below min_score."""
+        label, class_name = parse_target(target)
+        if not label:
+            return None
+        pool = self.candidates(label) if candidates is None else candidates
+        best = None
+        for node in pool:
+            match = self.score(node, label, class_name)
+            if best is None or match.score > best.score:
+                best = match
+        if best is None or best.score < min_score:
+            return None
+        return best
+
+def selector_for(node):
+    """Concrete plan target for a matched node: its text, else content-desc, else resource-id."""
+    if node.text and "'" not in node.text:
+        return f"text='{node.text}'"
+    for attr, value in (("content-desc", node.content_desc), ("resource-id", node.resource_id)):
+        if value and "'" not in value:
+            return f"xpath=//*[@{attr}='{value}']"
+    return None
+
+def match_element(target, nodes, min_score=ELEMENT_MATCH_MIN_SCORE) -> Optional[ElementMatch]:
+    """Resolve a failed click target against hierarchy nodes without any LLM call."""
+    return ElementIndex(nodes).best_match(target, min_score)
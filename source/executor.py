@@ -1,77 +1,161 @@
-import time
-import json
-from source.logger import logger
-from source.config import APP_CONTEXT_FILES, get_ui_elements_setting
+import argparse
+from source.logger import logger, LazyJSON
+from source.config import APP_CONTEXT_FILES, SCREEN_GRAPH_ENABLED, PLAN_VALIDATION_ENABLED, get_ui_elements_setting
 from source.device_manager import connect_to_device, launch_app
 from source.plan_generator import generate_plan, parse_plan
 from source.plan_executor import execute_plan
-from source.filter_ui_elements import extract_ui_elements
-from source.memory_state import memory_state
+from source.memory_state import RunContext, current_context
+from source.screen_graph import get_screen_graph
+from source.plan_trace import trace_from_context, save_trace, load_trace
+from source.plan_validator import validate_plan
+from source.hierarchy_store import dump_hierarchy
+from source.tracing import use_metrics
 
-def main():
-    """Main executor function that orchestrates the entire automation flow."""
-    
-    app_choice = ""
-    while app_choice not in APP_CONTEXT_FILES:
-        app_choice = input("Which app do you want to automate? (uber/zomato): ").strip().lower()
-        if app_choice not in APP_CONTEXT_FILES:
-            print("Invalid choice. Please enter 'uber' or 'zomato'.")
-    
+def _start_run(d, app_choice, user_prompt, verbose, ctx):
+    """Launch the app, snapshot the first screen and fill the run context for a request."""
+    ctx.metrics.reset()
     package_name, app_context_file = APP_CONTEXT_FILES[app_choice]
     
     # Get UI elements setting from configuration
     use_ui_elements = get_ui_elements_setting(app_choice)
     
-    user_prompt = input(f"📝 What do you want to do in {app_choice.title()}?\n> ").strip()
-    
-    # Connect to device and launch app
-    d = connect_to_device()
-    launch_app(d, package_name)
-    time.sleep(3)
+    settled_xml = launch_app(d, package_name)
     
-    # Extract UI elements if flag is enabled
+    # Snapshot the first screen; extract UI elements if flag is enabled
     ui_elements = None
+    ctx.hierarchy_store.clear()
+    xml_str = settled_xml or dump_hierarchy(d)
+    ctx.hierarchy_store.record(xml_str, step=-1)
     if use_ui_elements:
-        xml_str = d.dump_hierarchy(compressed=True)
-        ui_elements = extract_ui_elements(xml_str)
+        ui_elements = ctx.hierarchy_store.latest.ui_elements()
         logger.info(f"📱 Extracted {len(ui_elements)} UI elements")
-        print("UI Elements:")
-        print(json.dumps(ui_elements, indent=2))
+        if verbose:
+            logger.info("UI Elements:\n%s", LazyJSON(ui_elements))
+        else:
+            logger.debug("UI Elements:\n%s", LazyJSON(ui_elements))
     else:
         logger.info("📱 UI elements extraction disabled")
 
-    # Set memory state
-    memory_state.current_user_request = user_prompt
-    memory_state.current_app_context_file = app_context_file
-    memory_state.current_ui_elements = ui_elements
-    memory_state.current_use_ui_elements = use_ui_elements
+    # Set run context
+    ctx.current_user_request = user_prompt
+    ctx.current_package = package_name
+    ctx.current_app_context_file = app_context_file
+    ctx.current_ui_elements = ui_elements
+    ctx.current_use_ui_elements = use_ui_elements
+
+def run_automation(d, app_choice, user_prompt, verbose=True, ctx=None, record_path=None):
+    """Launch the app on a connected device, plan and execute one request.
+
+    State lives in ctx (a fresh RunContext per run; defaults to the bound context).
+    With record_path the executed steps and extracted answer are saved as a
+    trace that replay_automation can rerun without LLM calls.
+    Returns the extracted result or None.
+    """
+    if ctx is None:
+        ctx = current_context()
+    with use_metrics(ctx.metrics):
+        return _run_request(d, app_choice, user_prompt, verbose, ctx, record_path)
 
-    # Generate raw plan
-    raw_plan = generate_plan()
+def _run_request(d, app_choice, user_prompt, verbose, ctx, record_path):
+    _start_run(d, app_choice, user_prompt, verbose, ctx)
+    package_name = ctx.current_package
+
+    # Replay a known route from the screen graph, otherwise generate a raw plan
+    raw_plan = None
+    graph = get_screen_graph(package_name) if SCREEN_GRAPH_ENABLED else None
+    if graph is not None:
+        raw_plan = graph.plan_for(ctx.hierarchy_store.latest.fingerprint, user_prompt)
+        if raw_plan:
+            logger.info(f"🗺️ Known route with {len(raw_plan)} steps found in screen graph, skipping LLM planning")
+    if not raw_plan:
+        raw_plan = generate_plan(ctx)
     
+    result = None
     if raw_plan:
-        # Store raw plan in memory state
-        memory_state.current_plan = raw_plan
+        # Store raw plan in run context
+        ctx.current_plan = raw_plan
         
         # Log raw plan
-        logger.info("📋 Raw Plan Generated:")
-        logger.info(json.dumps(raw_plan, indent=2))
+        logger.info("📋 Raw Plan Generated:\n%s", LazyJSON(raw_plan))
         
         # Parse and remove unnecessary wait actions
-        parsed_plan = parse_plan(memory_state.current_plan)
+        parsed_plan = parse_plan(ctx.current_plan)
         
         # Log parsed plan
-        logger.info("🔧 Parsed Plan (after removing wait before extract):")
-        logger.info(json.dumps(parsed_plan, indent=2))
+        logger.info("🔧 Parsed Plan (after removing wait before extract):\n%s", LazyJSON(parsed_plan))
+        
+        # Validate against the launch screen, fixing targets locally or with one batched repair
+        if PLAN_VALIDATION_ENABLED:
+            parsed_plan = validate_plan(parsed_plan, ctx, ctx.hierarchy_store.latest).plan
         
-        # Update the parsed plan in memory state
-        memory_state.current_plan = parsed_plan
+        # Update the parsed plan in run context
+        ctx.current_plan = parsed_plan
         
         # Execute the parsed plan
-        result = execute_plan(d)
+        result = execute_plan(d, ctx)
+        if graph is not None:
+            graph.save()
         if result is not None:
             logger.info(f"✅ Final Result: {result}")
-            return  # Stop further execution after extraction
+    
+    if record_path:
+        save_trace(trace_from_context(ctx, app_choice, result), record_path)
+    return result
+
+def replay_automation(d, trace, verbose=True, ctx=None):
+    """Rerun a recorded trace step for step with LLM calls disabled.
+
+    Extract steps read the live screen with the local text tiers and fall back
+    to their recorded answers, so the run is bounded by device speed alone. The
+    first step that no longer works ends the replay without any fallback.
+    Runs in a fresh RunContext unless ctx is given; a given ctx gets its
+    llm_enabled flag back afterwards.
+    Returns the replayed result, or None if the route broke.
+    """
+    if ctx is None:
+        ctx = RunContext(llm_enabled=False)
+    llm_enabled, ctx.llm_enabled = ctx.llm_enabled, False
+    try:
+        with use_metrics(ctx.metrics):
+            _start_run(d, trace.app, trace.user_request, verbose, ctx)
+        ctx.current_plan = [dict(step) for step in trace.steps]
+        logger.info(f"📼 Replaying {len(ctx.current_plan)} recorded steps for '{trace.user_request}'")
+        result = execute_plan(d, ctx)
+    finally:
+        ctx.llm_enabled = llm_enabled
+    
+    if result is None:
+        logger.warning("⚠️ Replay did not reach the recorded result")
+    elif result != trace.result:
+        logger.warning(f"⚠️ Replay result {result!r} differs from recorded result {trace.result!r}")
+    else:
+        logger.info(f"✅ Replay matched recorded result: {result}")
+    return result
+
+def main():
+    """Main executor function that orchestrates the entire automation flow."""
+    parser = argparse.ArgumentParser(description="Run one automation request on a connected device.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="TRACE", help="save the executed steps and answer to a trace file")
+    mode.add_argument("--replay", metavar="TRACE", help="rerun a recorded trace without any LLM calls")
+    args = parser.parse_args()
+    
+    if args.replay:
+        trace = load_trace(args.replay)
+        replay_automation(connect_to_device(), trace)
+        return
+    
+    app_choice = ""
+    while app_choice not in APP_CONTEXT_FILES:
+        app_choice = input("Which app do you want to automate? (uber/zomato): ").strip().lower()
+        if app_choice not in APP_CONTEXT_FILES:
+            print("Invalid choice. Please enter 'uber' or 'zomato'.")
+    
+    user_prompt = input(f"📝 What do you want to do in {app_choice.title()}?\n> ").strip()
+    
+    # Connect to device and run the request
+    d = connect_to_device()
+    run_automation(d, app_choice, user_prompt, record_path=args.record)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
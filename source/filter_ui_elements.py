@@ -1,32 +1,107 @@
-import xml.etree.ElementTree as ET
+from typing import NamedTuple, Optional, Tuple
+from xml.parsers import expat
+from source.tracing import span
 
-def is_actionable(node):
-    cls = node.attrib.get("class", "")
-    clickable = node.attrib.get("clickable", "false") == "true"
-    focusable = node.attrib.get("focusable", "false") == "true"
-    editable = "EditText" in cls
-    checkable = node.attrib.get("checkable", "false") == "true"
-    return clickable or focusable or editable or checkable
+class UIElement(NamedTuple):
+    """Compact record of one hierarchy node with pre-parsed bounds"""
+    text: str
+    hint: str
+    resource_id: str
+    class_name: str
+    content_desc: str
+    clickable: bool
+    focusable: bool
+    long_clickable: bool
+    enabled: bool
+    checkable: bool
+    scrollable: bool
+    bounds: Optional[Tuple[int, int, int, int]]
+    raw_bounds: str
+
+    @property
+    def actionable(self):
+        return self.clickable or self.focusable or self.checkable or "EditText" in self.class_name
+
+    def to_dict(self):
+        """Serialise to the element dict shape used in prompts and logs."""
+        return {
+            "text": self.text,
+            "hint": self.hint,
+            "resource_id": self.resource_id,
+            "class": self.class_name,
+            "content_desc": self.content_desc,
+            "clickable": self.clickable,
+            "focusable": self.focusable,
+            "long_clickable": self.long_clickable,
+            "enabled": self.enabled,
+            "bounds": self.raw_bounds
+        }
+
+def parse_bounds(bounds):
+    """Parse a '[x1,y1][x2,y2]' bounds string into an (x1, y1, x2, y2) tuple, or None."""
+    numbers = bounds.replace("][", ",").strip("[]").split(",")
+    if len(numbers) != 4:
+        return None
+    try:
+        return tuple(int(n) for n in numbers)
+    except ValueError:
+        return None
+
+def is_actionable(attrs):
+    """Check whether a node's attribute mapping describes an element the user can act on."""
+    return (
+        attrs.get("clickable") == "true"
+        or attrs.get("focusable") == "true"
+        or "EditText" in attrs.get("class", "")
+        or attrs.get("checkable") == "true"
+    )
+
+def _element_from_attrs(attrs):
+    get = attrs.get
+    raw_bounds = get("bounds", "")
+    return UIElement(
+        get("text", "").strip(),
+        get("hint", "").strip(),
+        get("resource-id", ""),
+        get("class", ""),
+        get("content-desc", "").strip(),
+        get("clickable") == "true",
+        get("focusable") == "true",
+        get("long-clickable") == "true",
+        get("enabled") == "true",
+        get("checkable") == "true",
+        get("scrollable") == "true",
+        parse_bounds(raw_bounds),
+        raw_bounds,
+    )
+
+def parse_ui_nodes(xml_str, actionable_only=False):
+    """Stream a hierarchy dump through expat and return UIElement records in document order.
+
+    No element tree is built; each <node> is turned into a record as soon as
+    its start tag is seen.
+    """
+    records = []
+    append = records.append
+
+    def start_element(name, attrs):
+        if name != "node":
+            return
+        if actionable_only and not is_actionable(attrs):
+            return
+        append(_element_from_attrs(attrs))
+
+    with span("parse.hierarchy", bytes=len(xml_str)) as s:
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = start_element
+        parser.Parse(xml_str, True)
+        s.set(nodes=len(records))
+    return records
+
+def extract_ui_element_records(xml_str):
+    """Return actionable elements as compact UIElement records."""
+    return parse_ui_nodes(xml_str, actionable_only=True)
 
 def extract_ui_elements(xml_str):
-    root = ET.fromstring(xml_str)
-    elements = []
-
-    for node in root.iter("node"):
-        if not is_actionable(node):
-            continue
-
-        elements.append({
-            "text": node.attrib.get("text", "").strip(),
-            "hint": node.attrib.get("hint", "").strip(), 
-            "resource_id": node.attrib.get("resource-id", ""),
-            "class": node.attrib.get("class", ""),
-            "content_desc": node.attrib.get("content-desc", "").strip(),
-            "clickable": node.attrib.get("clickable", "false") == "true",
-            "focusable": node.attrib.get("focusable", "false") == "true",
-            "long_clickable": node.attrib.get("long-clickable", "false") == "true",
-            "enabled": node.attrib.get("enabled", "false") == "true",
-            "bounds": node.attrib.get("bounds", "")
-        })
-
-    return elements
+    """Return actionable elements as dicts (the shape embedded in LLM prompts)."""
+    return [record.to_dict() for record in parse_ui_nodes(xml_str, actionable_only=True)]
@@ -1,129 +1,238 @@
-import base64
+import contextvars
 import json
 import re
-import os
-import openai
-import time
+from concurrent.futures import ThreadPoolExecutor
 from source.logger import logger
-from source.screenshot_manager import take_screenshot
+from source.app_context import app_contexts
+from source.screenshot_manager import take_screenshot, to_data_url, frame_key, is_near_duplicate, frame_answer_cache
+from source.scroll_planner import scroll_planner, scroll_container
+from source.image_preprocess import prepare_for_vision
+from source.filter_ui_elements import parse_ui_nodes
+from source.hierarchy_store import capture_hierarchy, dump_hierarchy
+from source.prompt_encoder import encode_ui_elements
+from source.llm_client import get_llm_client
+from source.tracing import span
+from source.config import VISION_DETAIL, VISION_CROP_TO_SCROLLABLE, FALLBACK_PARALLEL_FRAMES, FALLBACK_PARALLEL_WORKERS
 
-def gpt_fallback(d, user_request, app_context_file, initial_screenshot_path=None):
+def gpt_fallback(d, user_request, app_context_file, initial_screenshot=None, parallel=FALLBACK_PARALLEL_FRAMES):
     """
     GPT fallback with scrolling loop for extraction
     Args:
         d: uiautomator2 device object
         user_request: user's request for extraction
         app_context_file: path to app context file
-        initial_screenshot_path: optional initial screenshot path (if already taken)
+        initial_screenshot: optional initial Screenshot (if already taken)
+        parallel: capture all scroll frames first and analyse them concurrently
     """
-    # Read app context for better understanding
-    app_context = ""
-    try:
-        with open(app_context_file, "r", encoding="utf-8") as f:
-            app_context = f.read()
-    except Exception as e:
-        logger.warning(f"⚠️ Could not read {app_context_file} for fallback: {e}")
+    # Static system prompt (instructions + app context) is precompiled once per app
+    template = app_contexts.template(app_context_file, "extract")
+    prompt = (template.system, template.render(user_request=user_request))
 
-    # Use a more specific prompt with app context
-    prompt = f"""This is a screenshot of the mobile app. The user request is: '{user_request}'.\n\nApp Context:\n{app_context}\n\nExtract the most relevant information from the screenshot to fulfill the user's request. \nLook for prices, times, availability or any information that matches what the user is asking for.\n\nIMPORTANT: You must respond with a JSON object in this exact format:\n{{"answer": "extracted value or NOT_FOUND", "found": true/false}}\n\nSet "found" to true only if you found the specific information the user is asking for. Set "found" to false if the information is not visible or not what the user requested."""
+    # Optionally restrict the vision input to the scrollable results area
+    nodes = _frame_nodes(d)
+    crop_box = None
+    if VISION_CROP_TO_SCROLLABLE and nodes:
+        try:
+            crop_box = scroll_container(nodes, scroll_planner.window_size(d))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not locate scrollable region for cropping: {e}")
 
-    # Scrolling loop: 5 turns maximum
+    if parallel:
+        return _gpt_fallback_parallel(d, user_request, prompt, crop_box, nodes, initial_screenshot)
+
+    # Scrolling loop: 5 turns maximum (scroll_page stops it at the end of the list)
     for scroll_turn in range(5):
         logger.info(f"🔄 GPT Fallback Scroll Turn {scroll_turn + 1}/5")
         
         # Take screenshot for current scroll position
-        if scroll_turn == 0 and initial_screenshot_path:
+        if scroll_turn == 0 and initial_screenshot:
             # Use the initial screenshot if provided
-            image_path = initial_screenshot_path
-            logger.info(f"📸 Using initial screenshot: {image_path}")
+            shot = initial_screenshot
+            logger.info(f"📸 Using initial screenshot: {shot.label}")
         else:
             # Take new screenshot
-            image_path = take_screenshot(d, f"gpt_fallback_scroll_{scroll_turn}")
-            logger.info(f"📸 Taking new screenshot: {image_path}")
+            shot = take_screenshot(d, f"gpt_fallback_scroll_{scroll_turn}")
         
-        # Process screenshot with GPT
-        try:
-            with open(image_path, "rb") as f:
-                b64_img = base64.b64encode(f.read()).decode("utf-8")
-
-            response = openai.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a mobile automation assistant. Extract only the requested information from the screenshot. Return only the value, no explanations."
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            { "type": "text", "text": prompt },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{b64_img}",
-                                    "detail": "high"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=150,
-                temperature=0.1
-            )
-            raw = response.choices[0].message.content.strip()
-            if raw.startswith("```"):
-                raw = re.sub(r"```[a-zA-Z]*", "", raw).strip("`").strip()
-            
-            # Parse JSON response
+        # Reuse the answer if this query was already asked on the same screen
+        key = frame_key(shot, nodes)
+        hit, answer = _cached_answer(user_request, key)
+        if hit:
+            if answer:
+                logger.info(f"♻️ Reusing cached answer on scroll turn {scroll_turn + 1}: {answer}")
+                return answer
+            logger.info(f"♻️ Frame already analysed without an answer, skipping vision call on turn {scroll_turn + 1}")
+        else:
             try:
-                result = json.loads(raw)
-                answer = result.get("answer", "")
-                found = result.get("found", False)
-                
-                if found and answer and answer.lower() != "not_found":
-                    logger.info(f"✅ GPT found answer on scroll turn {scroll_turn + 1}: {answer}")
+                answer = _analyse_frame(prompt, user_request, shot, key, crop_box, scroll_turn)
+                if answer:
                     return answer
-                else:
-                    logger.info(f"⚠️ No meaningful answer found on scroll turn {scroll_turn + 1}: {answer}")
-                    
-            except json.JSONDecodeError:
-                # Fallback for non-JSON responses
-                logger.warning(f"⚠️ GPT returned non-JSON response: {raw}")
-                if raw and raw.lower() not in ["none", "not found", "no information", "n/a", "", "not_found"]:
-                    logger.info(f"✅ GPT found answer on scroll turn {scroll_turn + 1}: {raw}")
-                    return raw
-                else:
-                    logger.info(f"⚠️ No meaningful answer found on scroll turn {scroll_turn + 1}: {raw}")
-            
-        except Exception as e:
-            logger.error(f"❌ GPT fallback failed on scroll turn {scroll_turn + 1}: {e}")
+            except Exception as e:
+                logger.error(f"❌ GPT fallback failed on scroll turn {scroll_turn + 1}: {e}")
         
         # Scroll down for next iteration (except on last turn)
         if scroll_turn < 4:  # Don't scroll on the last turn
-            try:
-                # Get screen dimensions for scrolling
-                screen_width = d.window_size()[0]
-                screen_height = d.window_size()[1]
-                
-                # Scroll up in the ride selection area (bottom half of screen)
-                start_x = screen_width // 2
-                start_y = int(screen_height * 0.5)  # 80% down 
-                end_x = screen_width // 2
-                end_y = int(screen_height * 0.2)    # 40% down 
-                
-                logger.info(f"📱 Scrolling: ({start_x}, {start_y}) → ({end_x}, {end_y})")
-                d.swipe(start_x, start_y, end_x, end_y, duration=0.8)
-                time.sleep(2)  # Wait longer for scroll animation and content to load
-                logger.info(f"✅ Scroll completed for turn {scroll_turn + 1}")
-                
-            except Exception as e:
-                logger.error(f"❌ Scrolling failed on turn {scroll_turn + 1}: {e}")
+            nodes = scroll_page(d, scroll_turn, nodes=nodes)
+            if nodes is None:
                 break
     
     logger.warning("⚠️ No answer found after 5 scroll attempts")
     return None
 
-def gpt_fallback_action(d, user_request, app_context_file, failed_step=None, ui_elements=None, use_ui_elements=True, initial_screenshot_path=None):
+def _gpt_fallback_parallel(d, user_request, prompt, crop_box, nodes, initial_screenshot=None):
+    """
+    Speculative extraction: keep swiping and capturing frames while the vision
+    requests for earlier frames run concurrently. The first frame that reports
+    an answer, in scroll order, wins; outstanding requests are then cancelled.
+    """
+    pool = ThreadPoolExecutor(max_workers=FALLBACK_PARALLEL_WORKERS, thread_name_prefix="vision")
+    frames = []  # (scroll_turn, future or None, cached answer)
+    try:
+        for scroll_turn in range(5):
+            logger.info(f"🔄 GPT Fallback Capture {scroll_turn + 1}/5 (parallel)")
+            if scroll_turn == 0 and initial_screenshot:
+                shot = initial_screenshot
+            else:
+                shot = take_screenshot(d, f"gpt_fallback_scroll_{scroll_turn}")
+            
+            key = frame_key(shot, nodes)
+            hit, answer = _cached_answer(user_request, key)
+            if hit:
+                frames.append((scroll_turn, None, answer))
+            else:
+                # Run in a copy of this context so spans land in the caller's metrics registry
+                frames.append((scroll_turn, pool.submit(
+                    contextvars.copy_context().run,
+                    _analyse_frame, prompt, user_request, shot, key, crop_box, scroll_turn
+                ), None))
+            
+            # An earlier frame may already have answered while we were capturing
+            answer = _first_answer(frames, block=False)
+            if answer:
+                return answer
+            
+            if scroll_turn < 4:
+                nodes = scroll_page(d, scroll_turn, nodes=nodes)
+                if nodes is None:
+                    break
+        
+        answer = _first_answer(frames, block=True)
+        if not answer:
+            logger.warning(f"⚠️ No answer found in {len(frames)} captured frames")
+        return answer
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _first_answer(frames, block):
+    """Return the answer of the earliest frame that found one, in scroll order.
+
+    Without block, stop at the first frame whose request is still running.
+    """
+    for scroll_turn, future, answer in frames:
+        if future is not None:
+            if not block and not future.done():
+                return None
+            try:
+                answer = future.result()
+            except Exception as e:
+                logger.error(f"❌ GPT fallback failed on scroll turn {scroll_turn + 1}: {e}")
+                answer = None
+        if answer:
+            logger.info(f"✅ Using answer from scroll turn {scroll_turn + 1}: {answer}")
+            return answer
+    return None
+
+def _frame_nodes(d):
+    """Parsed hierarchy of the screen the first frame shows, or None if it could not be dumped."""
+    try:
+        return parse_ui_nodes(dump_hierarchy(d))
+    except Exception as e:
+        logger.warning(f"⚠️ Could not dump hierarchy for frame keys: {e}")
+        return None
+
+def _cached_answer(user_request, key):
+    """Look up the frame answer cache, recording the outcome as a span."""
+    with span("cache.frame_answer") as s:
+        hit, answer = frame_answer_cache.get(user_request, key)
+        s.set(cache="hit" if hit else "miss")
+    return hit, answer
+
+def _analyse_frame(prompt, user_request, shot, key, crop_box, scroll_turn):
+    """Prepare one frame, ask the vision model about it and cache the outcome."""
+    image = prepare_for_vision(shot, crop_box)
+    answer = _extract_from_frame(prompt, image.data, image.mime_type, scroll_turn)
+    frame_answer_cache.put(user_request, key, answer)
+    return answer
+
+def _extract_from_frame(prompt, image_data, mime_type, scroll_turn):
+    """Ask the vision model for the requested value on one frame. Returns the answer or None.
+
+    prompt is the (system prompt, user text) pair built once per fallback.
+    """
+    system_prompt, user_text = prompt
+    raw = get_llm_client().chat(
+        model="gpt-4o",
+        messages=[
+            { "role": "system", "content": system_prompt },
+            {
+                "role": "user",
+                "content": [
+                    { "type": "text", "text": user_text },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": to_data_url(image_data, mime_type),
+                            "detail": VISION_DETAIL
+                        }
+                    }
+                ]
+            }
+        ],
+        max_tokens=150,
+        temperature=0.1
+    )
+    if raw.startswith("```"):
+        raw = re.sub(r"```[a-zA-Z]*", "", raw).strip("`").strip()
+    
+    # Parse JSON response
+    try:
+        result = json.loads(raw)
+        answer = result.get("answer", "")
+        found = result.get("found", False)
+        
+        if found and answer and answer.lower() != "not_found":
+            logger.info(f"✅ GPT found answer on scroll turn {scroll_turn + 1}: {answer}")
+            return answer
+        else:
+            logger.info(f"⚠️ No meaningful answer found on scroll turn {scroll_turn + 1}: {answer}")
+            
+    except json.JSONDecodeError:
+        # Fallback for non-JSON responses
+        logger.warning(f"⚠️ GPT returned non-JSON response: {raw}")
+        if raw and raw.lower() not in ["none", "not found", "no information", "n/a", "", "not_found"]:
+            logger.info(f"✅ GPT found answer on scroll turn {scroll_turn + 1}: {raw}")
+            return raw
+        else:
+            logger.info(f"⚠️ No meaningful answer found on scroll turn {scroll_turn + 1}: {raw}")
+    return None
+
+def scroll_page(d, scroll_turn, backward=False, nodes=None):
+    """Swipe the scrollable container one page (back up with backward) and wait for it to settle.
+
+    nodes is the current page when the caller has it (e.g. the previous call's
+    result), saving a dump. Returns the parsed nodes of the settled page, or
+    None if scrolling failed or the content did not move (end of the list).
+    """
+    try:
+        nodes = scroll_planner.scroll(d, scroll_turn, backward, nodes)
+        if nodes is not None:
+            logger.info(f"✅ Scroll completed for turn {scroll_turn + 1}")
+        return nodes
+        
+    except Exception as e:
+        logger.error(f"❌ Scrolling failed on turn {scroll_turn + 1}: {e}")
+        return None
+
+def gpt_fallback_action(d, user_request, app_context_file, failed_step=None, ui_elements=None, use_ui_elements=True, initial_screenshot=None, ctx=None, screen_changes=""):
     """
     GPT fallback action with scrolling loop for finding clickable elements
     Args:
@@ -133,81 +242,62 @@ def gpt_fallback_action(d, user_request, app_context_file, failed_step=None, ui_
         failed_step: information about the failed step
         ui_elements: available UI elements
         use_ui_elements: whether to use UI elements
-        initial_screenshot_path: optional initial screenshot path (if already taken)
+        initial_screenshot: optional initial Screenshot (if already taken)
+        ctx: optional RunContext whose hierarchy store receives the pre-action dump
+        screen_changes: what the steps before the failure changed on screen (HierarchyDiff.to_prompt lines)
     """
-    # Read app context for better understanding
-    app_context = ""
-    try:
-        with open(app_context_file, "r", encoding="utf-8") as f:
-            app_context = f.read()
-    except Exception as e:
-        logger.warning(f"⚠️ Could not read {app_context_file} for fallback: {e}")
+    # Static system prompt (instructions + app context) is precompiled once per app
+    template = app_contexts.template(app_context_file, "action")
     
     # Add UI elements context if available
     ui_elements_context = ""
     if use_ui_elements and ui_elements:
-        ui_elements_context = f"\n\nCurrent UI Elements Available:\n{json.dumps(ui_elements, indent=2)}"
+        encoded = encode_ui_elements(ui_elements, f"{user_request} {failed_step or ''}")
+        ui_elements_context = f"\n\nCurrent UI Elements Available:\n{encoded.text}"
         logger.info(f"📱 Using {len(ui_elements)} UI elements for fallback action")
     
     # Build context about the failure
     failure_context = ""
     if failed_step:
         failure_context = f"\nThe automation failed at step: {failed_step}"
+    if screen_changes:
+        failure_context += f"\n{screen_changes}"
     
-    prompt = f"""This is a screenshot of the mobile app. The automation failed to find or interact with the expected element.
-
-User Request: '{user_request}'{failure_context}
-
-App Context:
-{app_context}{ui_elements_context}
-
-Based on the screenshot and app context, what is the next UI action needed to progress toward the user's goal?
-
-You must respond with a SINGLE JSON object in this exact format. Following is just an example, your answer should be in accordance with the query and app context:
-
-{{ "action": "click", "target": "text='Button Text'", "found": true }}
-OR
-{{ "action": "click", "target": "xpath=//android.widget.TextView[contains(@text, 'Partial Text')]", "found": true }}
-OR
-{{ "action": "type", "value": "text to type", "found": true }}
-OR
-{{ "action": "extract", "target": "xpath=//android.widget.TextView[contains(@text, '$')]", "found": true }}
-
-Valid actions: "click", "type", "wait", "extract"
-Valid targets: "text='exact text'", "xpath=//path/to/element"
-For typing: use "value" field instead of "target"
-For extract: use "target" field with xpath to find elements to extract text from
-
-IMPORTANT: Set "found" to true only if you can see a clear, actionable element in the screenshot. Set "found" to false if no suitable element is visible.
-
-Only return the JSON object - no explanations or markdown formatting."""
+    prompt = template.render(user_request=user_request, failure_context=failure_context,
+                             ui_elements=ui_elements_context)
     
     # Scrolling loop: 5 turns maximum
+    nodes = _frame_nodes(d)
+    rejected_frames = []  # Keys of frames the model already answered "not found" for
     for scroll_turn in range(5):
         logger.info(f"🔄 GPT Fallback Action Scroll Turn {scroll_turn + 1}/5")
         
         # Take screenshot for current scroll position
-        if scroll_turn == 0 and initial_screenshot_path:
+        if scroll_turn == 0 and initial_screenshot:
             # Use the initial screenshot if provided
-            image_path = initial_screenshot_path
-            logger.info(f"📸 Using initial screenshot: {image_path}")
+            shot = initial_screenshot
+            logger.info(f"📸 Using initial screenshot: {shot.label}")
         else:
             # Take new screenshot
-            image_path = take_screenshot(d, f"gpt_fallback_action_scroll_{scroll_turn}")
-            logger.info(f"📸 Taking new screenshot: {image_path}")
+            shot = take_screenshot(d, f"gpt_fallback_action_scroll_{scroll_turn}")
+        
+        # Skip the vision call for frames already analysed without a usable element
+        key = frame_key(shot, nodes)
+        if any(is_near_duplicate(key, rejected) for rejected in rejected_frames):
+            logger.info(f"♻️ Frame already analysed, skipping vision call on turn {scroll_turn + 1}")
+            if scroll_turn < 4:
+                nodes = scroll_page(d, scroll_turn, nodes=nodes)
+                if nodes is None:
+                    break
+            continue
         
         # Process screenshot with GPT
         try:
-            with open(image_path, "rb") as f:
-                b64_img = base64.b64encode(f.read()).decode("utf-8")
-
-            response = openai.chat.completions.create(
+            image = prepare_for_vision(shot)
+            raw = get_llm_client().chat(
                 model="gpt-4o",
                 messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a mobile automation assistant. You must return ONLY a valid JSON object with action, target/value, and found fields. No explanations."
-                    },
+                    { "role": "system", "content": template.system },
                     {
                         "role": "user",
                         "content": [
@@ -215,8 +305,8 @@ Only return the JSON object - no explanations or markdown formatting."""
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/png;base64,{b64_img}",
-                                    "detail": "high"
+                                    "url": to_data_url(image.data, image.mime_type),
+                                    "detail": VISION_DETAIL
                                 }
                             }
                         ]
@@ -225,7 +315,6 @@ Only return the JSON object - no explanations or markdown formatting."""
                 max_tokens=200,
                 temperature=0.1
             )
-            raw = response.choices[0].message.content.strip()
             
             # Clean up response
             if raw.startswith("```"):
@@ -264,7 +353,10 @@ Only return the JSON object - no explanations or markdown formatting."""
                     # Dump hierarchy before clicking to ensure fresh UI state
                     logger.info("📱 Dumping hierarchy before action...")
                     try:
-                        d.dump_hierarchy(compressed=True)
+                        if ctx is not None:
+                            capture_hierarchy(d, ctx.hierarchy_store)
+                        else:
+                            dump_hierarchy(d)
                         logger.info("✅ Hierarchy dumped successfully")
                     except Exception as e:
                         logger.warning(f"⚠️ Failed to dump hierarchy: {e}")
@@ -272,6 +364,7 @@ Only return the JSON object - no explanations or markdown formatting."""
                     return result
                 else:
                     logger.info(f"⚠️ No actionable element found on scroll turn {scroll_turn + 1}")
+                    rejected_frames.append(key)
                     
             except json.JSONDecodeError as e:
                 logger.error(f"❌ GPT fallback action JSON parsing failed on scroll turn {scroll_turn + 1}: {e}")
@@ -284,24 +377,8 @@ Only return the JSON object - no explanations or markdown formatting."""
         
         # Scroll down for next iteration (except on last turn)
         if scroll_turn < 4:  # Don't scroll on the last turn
-            try:
-                # Get screen dimensions for scrolling
-                screen_width = d.window_size()[0]
-                screen_height = d.window_size()[1]
-                
-                # Scroll up in the ride selection area (bottom half of screen)
-                start_x = screen_width // 2
-                start_y = int(screen_height * 0.5)  # 80% down 
-                end_x = screen_width // 2
-                end_y = int(screen_height * 0.2)    # 40% down 
-                
-                logger.info(f"📱 Scrolling: ({start_x}, {start_y}) → ({end_x}, {end_y})")
-                d.swipe(start_x, start_y, end_x, end_y, duration=0.8)
-                time.sleep(2)  # Wait longer for scroll animation and content to load
-                logger.info(f"✅ Scroll completed for turn {scroll_turn + 1}")
-                
-            except Exception as e:
-                logger.error(f"❌ Scrolling failed on turn {scroll_turn + 1}: {e}")
+            nodes = scroll_page(d, scroll_turn, nodes=nodes)
+            if nodes is None:
                 break
     
     logger.warning("⚠️ No actionable element found after 5 scroll attempts")
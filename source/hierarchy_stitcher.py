@@ -0,0 +1,149 @@
+from collections import Counter
+from source.logger import logger
+from source.scroll_planner import scroll_container
+
+def _format_bounds(bounds):
+    x1, y1, x2, y2 = bounds
+    return f"[{x1},{y1}][{x2},{y2}]"
+
+def _identity(node):
+    """What a node is regardless of scroll position: resource-id, text and horizontal extent."""
+    return (node.resource_id, node.text, node.content_desc, node.class_name, node.bounds[0], node.bounds[2])
+
+class HierarchyStitcher:
+    """Merges successive dumps of a scrolled list into one deduplicated virtual list.
+
+    Nodes inside the scrollable container are moved into list coordinates: the
+    first page's layout, extended downwards by the scroll offset of each later
+    page. The offset is the most common vertical shift of nodes seen on both
+    pages. A node is a duplicate when one with the same resource-id, text and
+    horizontal extent already covers an overlapping vertical range; a node that
+    was clipped at a page edge grows to its full extent instead of repeating.
+    Nodes outside the container (toolbars, bottom buttons) are kept once.
+    Without an explicit container, the first page's scroll_container() is used
+    (pass the device window so carousels are skipped like the scroll planner does).
+    """
+
+    def __init__(self, container=None, window=None):
+        self.container = container
+        self.window = window
+        self.pages = 0
+        self.scrolls = 0
+        self.offset = 0  # list y of the current page's container top
+        self._nodes = []
+        self._by_identity = {}  # identity -> indexes into _nodes
+        self._list_bottom = 0  # lowest list y of any node inside the container
+        self._footer = set()  # indexes of fixed nodes below the container
+        self._previous = None  # {identity: y1} of the last page's container nodes
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @property
+    def nodes(self):
+        """All distinct nodes in list coordinates, top to bottom.
+
+        Fixed nodes below the container (e.g. a bottom button) are moved below
+        the end of the list so they do not interleave with rows scrolled in.
+        """
+        shift = self._list_bottom - self.container[3] if self.container else 0
+        nodes = []
+        for index, node in enumerate(self._nodes):
+            if shift > 0 and index in self._footer:
+                x1, y1, x2, y2 = node.bounds
+                node = node._replace(bounds=(x1, y1 + shift, x2, y2 + shift))
+            nodes.append(node)
+        return sorted(nodes, key=lambda node: (node.bounds[1], node.bounds[0]))
+
+    def _inside(self, bounds):
+        if not self.container:
+            return False
+        x1, y1, x2, y2 = self.container
+        return x1 <= bounds[0] and y1 <= bounds[1] and bounds[2] <= x2 and bounds[3] <= y2
+
+    def _page_shift(self, positions):
+        """How far the content moved up since the previous page, from nodes seen on both."""
+        if self._previous is None or not self.container:
+            return 0
+        shifts = Counter(self._previous[key] - y1 for key, y1 in positions.items()
+                         if key in self._previous and (key[0] or key[1] or key[2]))
+        if not shifts:
+            # Nothing in common: assume the page moved by a whole container height
+            return self.container[3] - self.container[1]
+        return shifts.most_common(1)[0][0]
+
+    def add_page(self, nodes):
+        """Merge one page of parsed nodes. Returns the nodes that were new, in list coordinates."""
+        if self.container is None and self.pages == 0:
+            self.container = scroll_container(nodes, self.window)
+
+        # Nodes whose identity repeats within a page (e.g. empty spacers) cannot anchor the shift
+        positions, repeated = {}, set()
+        for node in nodes:
+            if node.bounds and self._inside(node.bounds) and not node.scrollable:
+                key = _identity(node)
+                if key in positions:
+                    repeated.add(key)
+                positions[key] = node.bounds[1]
+        for key in repeated:
+            del positions[key]
+        self.offset += self._page_shift(positions)
+        self._previous = positions
+        self.pages += 1
+
+        added = []
+        for node in nodes:
+            if not node.bounds:
+                continue
+            x1, y1, x2, y2 = node.bounds
+            inside = self._inside(node.bounds) and not node.scrollable
+            if inside:
+                y1, y2 = y1 + self.offset, y2 + self.offset
+                self._list_bottom = max(self._list_bottom, y2)
+            merged = self._merge(node, (x1, y1, x2, y2))
+            if merged is not None:
+                if not inside and self.container and y1 >= self.container[3]:
+                    self._footer.add(len(self._nodes) - 1)
+                added.append(merged)
+        return added
+
+    def _merge(self, node, bounds):
+        """Add node at list bounds unless an overlapping copy exists. Returns the new node or None."""
+        key = _identity(node)
+        for index in self._by_identity.get(key, ()):
+            existing = self._nodes[index].bounds
+            if bounds[1] < existing[3] and existing[1] < bounds[3]:
+                if bounds[1] < existing[1] or bounds[3] > existing[3]:
+                    union = (existing[0], min(existing[1], bounds[1]), existing[2], max(existing[3], bounds[3]))
+                    self._nodes[index] = self._nodes[index]._replace(bounds=union, raw_bounds=_format_bounds(union))
+                return None
+        stitched = node._replace(bounds=bounds, raw_bounds=_format_bounds(bounds))
+        self._by_identity.setdefault(key, []).append(len(self._nodes))
+        self._nodes.append(stitched)
+        return stitched
+
+def stitch_pages(d, stitcher, scroll, max_scrolls, nodes=None):
+    """
+    Swipe through the scrollable list, merging each page into the stitcher.
+    Args:
+        d: uiautomator2 device object
+        stitcher: HierarchyStitcher already holding the current page
+        scroll: callable(d, scroll_turn, nodes=...) performing one swipe from the given page and
+            returning the parsed nodes of the settled page, or None when the content did not move
+        max_scrolls: maximum number of swipes
+        nodes: parsed nodes of the page on screen, if the caller has them
+    Yields:
+        The new nodes of each page, so callers can query the list so far and stop early.
+        Stops when a swipe fails or a page adds no new nodes; stitcher.scrolls counts the swipes.
+    """
+    for turn in range(max_scrolls):
+        nodes = scroll(d, turn, nodes=nodes)
+        if nodes is None:
+            return
+        stitcher.scrolls += 1
+        added = stitcher.add_page(nodes)
+        if not added:
+            logger.info(f"🧵 No new nodes after scroll {turn + 1}, end of list")
+            return
+        logger.info(f"🧵 Scroll {turn + 1}: +{len(added)} nodes ({len(stitcher)} stitched)")
+        yield added
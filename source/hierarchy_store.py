@@ -0,0 +1,151 @@
+import hashlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from source.logger import logger
+from source.config import HIERARCHY_SNAPSHOT_LIMIT
+from source.filter_ui_elements import parse_ui_nodes, UIElement
+from source.tracing import span
+
+def node_key(node):
+    """Identity of a node across dumps: resource-id, class and bounds."""
+    return (node.resource_id, node.class_name, node.raw_bounds)
+
+def _index_nodes(nodes):
+    """Map node keys to records, numbering repeated keys in document order."""
+    index = {}
+    seen = {}
+    for node in nodes:
+        key = node_key(node)
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        index[key + (occurrence,)] = node
+    return index
+
+def screen_fingerprint(nodes):
+    """Structural identity of a screen: the set of (class, resource-id) pairs, ignoring text and scroll position."""
+    pairs = sorted({(node.class_name, node.resource_id) for node in nodes if node.resource_id})
+    if not pairs:
+        # Screens without resource ids (e.g. Compose) fall back to their class layout
+        pairs = sorted({(node.class_name, "") for node in nodes})
+    return hashlib.sha1(repr(pairs).encode("utf-8")).hexdigest()[:16]
+
+def _describe(node):
+    label = node.text or node.content_desc or node.hint
+    parts = [node.class_name.rsplit(".", 1)[-1]]
+    if label:
+        parts.append(f"'{label}'")
+    if node.resource_id:
+        parts.append(node.resource_id.rsplit("/", 1)[-1])
+    return " ".join(parts)
+
+@dataclass
+class HierarchySnapshot:
+    """One parsed hierarchy dump"""
+    step: Optional[int]
+    signature: str
+    nodes: List[UIElement]
+    index: Dict[Tuple, UIElement]
+    xml: str
+    fingerprint: str = ""
+
+    def ui_elements(self):
+        """Actionable elements in the dict shape used by prompts."""
+        return [node.to_dict() for node in self.nodes if node.actionable]
+
+@dataclass
+class HierarchyDiff:
+    """Structural difference between two snapshots"""
+    added: List[UIElement] = field(default_factory=list)
+    removed: List[UIElement] = field(default_factory=list)
+    changed: List[Tuple[UIElement, UIElement]] = field(default_factory=list)
+
+    @property
+    def is_empty(self):
+        return not (self.added or self.removed or self.changed)
+
+    def summary(self):
+        return f"+{len(self.added)} -{len(self.removed)} ~{len(self.changed)}"
+
+    def to_prompt(self, limit=40):
+        """Render a compact, line-per-change description suitable for an LLM prompt."""
+        lines = [f"+ {_describe(node)}" for node in self.added]
+        lines += [f"- {_describe(node)}" for node in self.removed]
+        lines += [f"~ {_describe(old)} -> {_describe(new)}" for old, new in self.changed]
+        if len(lines) > limit:
+            lines = lines[:limit] + [f"... {len(lines) - limit} more changes"]
+        return "\n".join(lines)
+
+def diff_snapshots(old, new):
+    """Compute added/removed/changed nodes between two snapshots."""
+    if old is None:
+        return HierarchyDiff(added=list(new.nodes))
+    if old.signature == new.signature:
+        return HierarchyDiff()
+    diff = HierarchyDiff()
+    for key, node in new.index.items():
+        previous = old.index.get(key)
+        if previous is None:
+            diff.added.append(node)
+        elif previous != node:
+            diff.changed.append((previous, node))
+    for key, node in old.index.items():
+        if key not in new.index:
+            diff.removed.append(node)
+    return diff
+
+class HierarchySnapshotStore:
+    """Keeps recent parsed hierarchy dumps so callers can diff instead of re-extracting."""
+
+    def __init__(self, max_snapshots=HIERARCHY_SNAPSHOT_LIMIT):
+        self._snapshots = deque(maxlen=max_snapshots)
+
+    @property
+    def latest(self):
+        return self._snapshots[-1] if self._snapshots else None
+
+    def clear(self):
+        self._snapshots.clear()
+
+    def record(self, xml_str, step=None):
+        """Parse and store a dump, returning its diff against the previous snapshot.
+
+        An identical dump reuses the previous parse instead of re-parsing.
+        """
+        signature = hashlib.sha1(xml_str.encode("utf-8")).hexdigest()
+        previous = self.latest
+        if previous is not None and previous.signature == signature:
+            snapshot = HierarchySnapshot(step, signature, previous.nodes, previous.index, previous.xml, previous.fingerprint)
+        else:
+            nodes = parse_ui_nodes(xml_str)
+            snapshot = HierarchySnapshot(step, signature, nodes, _index_nodes(nodes), xml_str, screen_fingerprint(nodes))
+        self._snapshots.append(snapshot)
+        return diff_snapshots(previous, snapshot)
+
+    def snapshot_at(self, step):
+        """Return the latest snapshot taken at or before the given step, or None."""
+        for snapshot in reversed(self._snapshots):
+            if snapshot.step is not None and snapshot.step <= step:
+                return snapshot
+        return None
+
+    def diff_since(self, step):
+        """What changed on screen between the given step and the latest dump."""
+        if self.latest is None:
+            return HierarchyDiff()
+        return diff_snapshots(self.snapshot_at(step), self.latest)
+
+def dump_hierarchy(d):
+    """Dump the compressed device hierarchy, recording a traced span."""
+    with span("device.dump_hierarchy") as s:
+        xml_str = d.dump_hierarchy(compressed=True)
+        s.set(bytes=len(xml_str))
+    return xml_str
+
+def capture_hierarchy(d, store, step=None):
+    """Dump the device hierarchy into the store and return (snapshot, diff)."""
+    xml_str = dump_hierarchy(d)
+    diff = store.record(xml_str, step)
+    if not diff.is_empty:
+        logger.info(f"🧩 Hierarchy changed since last dump: {diff.summary()}")
+    return store.latest, diff
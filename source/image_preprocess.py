@@ -0,0 +1,69 @@
+import io
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from source.logger import logger
+from source.config import VISION_MAX_LONG_EDGE, VISION_IMAGE_FORMAT, VISION_IMAGE_QUALITY
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+@dataclass
+class PreparedImage:
+    """A screenshot re-encoded for a vision request"""
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    size: Optional[Tuple[int, int]] = None
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.data)
+
+def prepare_for_vision(shot, crop_box=None, max_long_edge=VISION_MAX_LONG_EDGE,
+                       image_format=VISION_IMAGE_FORMAT, quality=VISION_IMAGE_QUALITY):
+    """
+    Crop, downscale and re-encode a screenshot before sending it to a vision model.
+    Args:
+        shot: Screenshot captured by take_screenshot
+        crop_box: optional (left, top, right, bottom) region in screen pixels, e.g. a scrollable container
+        max_long_edge: longest side in pixels after downscaling (None keeps the resolution)
+        image_format: "JPEG", "WEBP" or "PNG"
+        quality: encoder quality for lossy formats
+    Returns:
+        PreparedImage; falls back to the original bytes if processing fails or does not shrink the image
+    """
+    original_bytes = len(shot.data)
+    try:
+        from PIL import Image  # deferred: Pillow is only needed once a frame is sent to the model
+        image = Image.open(io.BytesIO(shot.data))
+        image.load()
+
+        if crop_box:
+            left, top, right, bottom = crop_box
+            left, top = max(0, left), max(0, top)
+            right, bottom = min(image.width, right), min(image.height, bottom)
+            if right > left and bottom > top:
+                image = image.crop((left, top, right, bottom))
+
+        long_edge = max(image.size)
+        if max_long_edge and long_edge > max_long_edge:
+            scale = max_long_edge / long_edge
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+        if image_format in ("JPEG", "WEBP") and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality)
+        prepared = PreparedImage(buffer.getvalue(), _MIME_TYPES[image_format], original_bytes, image.size)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not preprocess screenshot {shot.label}, sending original: {e}")
+        return PreparedImage(shot.data, shot.mime_type, original_bytes)
+
+    if prepared.bytes_saved <= 0 and not crop_box:
+        return PreparedImage(shot.data, shot.mime_type, original_bytes)
+
+    logger.info(
+        f"🗜️ Vision image {shot.label}: {original_bytes / 1024:.1f} KB → {len(prepared.data) / 1024:.1f} KB "
+        f"({prepared.size[0]}x{prepared.size[1]}, saved {prepared.bytes_saved / 1024:.1f} KB)"
+    )
+    return prepared
@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+from source.logger import logger
+from source.tracing import span
+from source.config import (
+    PLAN_MODEL, OPENAI_API_KEY, OPENAI_BASE_URL, LLM_TIMEOUT, LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_MAX_CONNECTIONS
+)
+
+# openai and httpx take most of the CLI's import time, so they are imported when
+# the first client is built rather than at module import.
+
+# === Retry Policy ===
+def is_retryable(error):
+    """Retry on timeouts, connection errors, 429 and 5xx responses."""
+    import openai
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def backoff_delay(attempt, error=None, base=LLM_BACKOFF_BASE, cap=LLM_BACKOFF_MAX):
+    """Full-jitter exponential backoff, honouring a server Retry-After header when present."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _content(response):
+    return (response.choices[0].message.content or "").strip()
+
+def _record_usage(llm_span, response, attempts):
+    """Attach token usage and retry count from a completion to its span."""
+    usage = getattr(response, "usage", None)
+    llm_span.set(
+        attempts=attempts,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+    )
+
+# === Clients ===
+class LLMClient:
+    """Synchronous chat-completions client with a pooled HTTP connection, timeouts and retries."""
+
+    def __init__(self, api_key=None, base_url=OPENAI_BASE_URL, timeout=LLM_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, max_connections=LLM_MAX_CONNECTIONS, sleep=time.sleep):
+        import httpx
+        import openai
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._sleep = sleep
+        self._http = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        # Retries are handled here so the policy is identical for sync and async clients
+        self._client = openai.OpenAI(
+            api_key=api_key or OPENAI_API_KEY, base_url=base_url,
+            http_client=self._http, timeout=timeout, max_retries=0
+        )
+
+    def complete(self, messages, model=PLAN_MODEL, timeout=None, **kwargs):
+        """Create a chat completion, retrying transient failures. Returns the raw response."""
+        with span("llm.chat", model=model) as llm_span:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self._client.chat.completions.create(
+                        model=model, messages=messages, timeout=timeout or self.timeout, **kwargs
+                    )
+                    _record_usage(llm_span, response, attempt + 1)
+                    return response
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        raise
+                    delay = backoff_delay(attempt, e)
+                    logger.warning(f"⚠️ LLM call failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                    self._sleep(delay)
+
+    def chat(self, messages, model=PLAN_MODEL, timeout=None, **kwargs):
+        """Create a chat completion and return the stripped message content."""
+        return _content(self.complete(messages, model=model, timeout=timeout, **kwargs))
+
+    def close(self):
+        self._http.close()
+
+class AsyncLLMClient:
+    """asyncio variant of LLMClient sharing the same timeout and retry policy."""
+
+    def __init__(self, api_key=None, base_url=OPENAI_BASE_URL, timeout=LLM_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, max_connections=LLM_MAX_CONNECTIONS, sleep=None):
+        import asyncio
+        import httpx
+        import openai
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._sleep = sleep or asyncio.sleep
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self._client = openai.AsyncOpenAI(
+            api_key=api_key or OPENAI_API_KEY, base_url=base_url,
+            http_client=self._http, timeout=timeout, max_retries=0
+        )
+
+    async def complete(self, messages, model=PLAN_MODEL, timeout=None, **kwargs):
+        """Create a chat completion, retrying transient failures. Returns the raw response."""
+        with span("llm.chat", model=model) as llm_span:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self._client.chat.completions.create(
+                        model=model, messages=messages, timeout=timeout or self.timeout, **kwargs
+                    )
+                    _record_usage(llm_span, response, attempt + 1)
+                    return response
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        raise
+                    delay = backoff_delay(attempt, e)
+                    logger.warning(f"⚠️ LLM call failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                    await self._sleep(delay)
+
+    async def chat(self, messages, model=PLAN_MODEL, timeout=None, **kwargs):
+        """Create a chat completion and return the stripped message content."""
+        return _content(await self.complete(messages, model=model, timeout=timeout, **kwargs))
+
+    async def aclose(self):
+        await self._http.aclose()
+
+# === Shared Instance ===
+_client = None
+_client_lock = threading.Lock()
+
+def get_llm_client():
+    """Return the process-wide LLMClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
+
+def set_llm_client(client):
+    """Swap the process-wide client (e.g. for one pointed at a local stub server). Returns the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+        return previous
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from source.logger import logger
+from source.config import LOCATOR_CACHE_PATH, LOCATOR_MAX_FAILURES
+
+class LocatorMemory:
+    """Persistent memory of selectors that resolved a failed click target.
+
+    Entries are keyed by (app package, screen fingerprint, original target) and
+    store the concrete selector that eventually succeeded. A selector that fails
+    LOCATOR_MAX_FAILURES times in a row is invalidated.
+    """
+
+    def __init__(self, path=LOCATOR_CACHE_PATH, max_failures=LOCATOR_MAX_FAILURES):
+        self.path = path
+        self.max_failures = max_failures
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.invalidations = 0
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(package, screen, target):
+        return hashlib.sha1(f"{package}\n{screen}\n{target}".encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read locator cache {self.path}, starting empty: {e}")
+            self._entries = {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not write locator cache {self.path}: {e}")
+
+    def lookup(self, package, screen, target):
+        """Return the learned selector for a target on this screen, or None."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(self.make_key(package, screen, target))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["selector"]
+
+    def record_success(self, package, screen, target, selector):
+        """Remember (or confirm) the selector that worked for a target."""
+        with self._lock:
+            self._load()
+            key = self.make_key(package, screen, target)
+            entry = self._entries.get(key)
+            if entry is None or entry["selector"] != selector:
+                self.learned += 1
+                logger.info(f"🧠 Learned locator for {target}: {selector}")
+                entry = {"package": package, "screen": screen, "target": target,
+                         "selector": selector, "successes": 0}
+            entry["successes"] += 1
+            entry["failures"] = 0
+            entry["updated"] = time.time()
+            self._entries[key] = entry
+            self._save()
+
+    def record_failure(self, package, screen, target):
+        """Count a failed replay of a learned selector and invalidate it once it keeps failing."""
+        with self._lock:
+            self._load()
+            key = self.make_key(package, screen, target)
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["failures"] = entry.get("failures", 0) + 1
+            if entry["failures"] >= self.max_failures:
+                del self._entries[key]
+                self.invalidations += 1
+                logger.info(f"🗑️ Invalidated learned locator for {target}: {entry['selector']}")
+            self._save()
+
+    def stats(self):
+        """Return lookup/learning counters."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "learned": self.learned,
+            "invalidations": self.invalidations,
+        }
+
+# Global locator memory instance
+locator_memory = LocatorMemory()
@@ -1,19 +1,109 @@
-import os
+import atexit
+import json
 import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from source.config import LOG_PATH, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_JSONL_PATH, TRACE_PATH
 
-os.makedirs("logs", exist_ok=True)
+class LazyJSON:
+    """Defers json.dumps until a log record is actually rendered.
 
-logger = logging.getLogger("agent")
-logger.setLevel(logging.INFO)
+    logger.debug("Plan:\\n%s", LazyJSON(plan)) costs nothing when DEBUG is off.
+    The object is rendered when the record is queued, so later mutations do not
+    leak into the log line.
+    """
+    __slots__ = ("obj", "indent")
+
+    def __init__(self, obj, indent=2):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.obj, indent=self.indent, ensure_ascii=False, default=str)
+
+class JSONLinesFormatter(logging.Formatter):
+    """One compact JSON object per record for machine consumption."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def _build_handlers():
+    """Handlers run on the listener thread: rotating file, console and optional JSON lines."""
+    os.makedirs(os.path.dirname(LOG_PATH) or ".", exist_ok=True)
 
-# Prevent adding handlers multiple times
-if not logger.handlers:
     # File handler
-    file_handler = logging.FileHandler("logs/agent.log", mode="a")
+    file_handler = RotatingFileHandler(LOG_PATH, mode="a", maxBytes=LOG_MAX_BYTES,
+                                       backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
     file_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
-    logger.addHandler(file_handler)
 
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(logging.Formatter("%(levelname)s | %(message)s"))
-    logger.addHandler(console_handler)
+
+    handlers = [file_handler, console_handler]
+    if LOG_JSONL_PATH:
+        os.makedirs(os.path.dirname(LOG_JSONL_PATH) or ".", exist_ok=True)
+        jsonl_handler = RotatingFileHandler(LOG_JSONL_PATH, mode="a", maxBytes=LOG_MAX_BYTES,
+                                            backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+        jsonl_handler.setFormatter(JSONLinesFormatter())
+        handlers.append(jsonl_handler)
+    return handlers
+
+def _build_trace_handlers():
+    """Rotating JSON-lines file for span records, which arrive already serialized."""
+    os.makedirs(os.path.dirname(TRACE_PATH) or ".", exist_ok=True)
+    trace_handler = RotatingFileHandler(TRACE_PATH, mode="a", maxBytes=LOG_MAX_BYTES,
+                                        backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    trace_handler.setFormatter(logging.Formatter("%(message)s"))
+    return [trace_handler]
+
+class _LazyQueueHandler(QueueHandler):
+    """QueueHandler that creates logs/ and starts the listener on the first record.
+
+    Importing the logger therefore opens no files and starts no threads.
+    """
+
+    def __init__(self, build_handlers=_build_handlers):
+        super().__init__(queue.SimpleQueue())
+        self.listener = None
+        self._build_handlers = build_handlers
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self.listener is None:
+                listener = QueueListener(self.queue, *self._build_handlers(), respect_handler_level=True)
+                listener.start()
+                atexit.register(listener.stop)
+                self.listener = listener
+
+    def enqueue(self, record):
+        if self.listener is None:
+            self._start()
+        super().enqueue(record)
+
+logger = logging.getLogger("agent")
+logger.setLevel(logging.INFO)
+
+# Prevent adding handlers multiple times
+if not logger.handlers:
+    # Callers only enqueue records; formatting and I/O happen on the listener thread.
+    # The QueueHandler has no formatter, so prepare() only merges msg % args.
+    logger.addHandler(_LazyQueueHandler())
+
+# Span records for logs/trace.jsonl (see source.tracing); kept out of the main log
+trace_logger = logging.getLogger("agent.trace")
+trace_logger.setLevel(logging.INFO)
+trace_logger.propagate = False
+if not trace_logger.handlers:
+    trace_logger.addHandler(_LazyQueueHandler(_build_trace_handlers))
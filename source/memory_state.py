@@ -1,16 +1,86 @@
-from dataclasses import dataclass
-from typing import List, Optional
-
-@dataclass
-class MemoryState:
-    """Global memory state for automation execution"""
-    current_plan: Optional[List] = None
-    current_step_index: int = 0
-    failed_nav_fallbacks: int = 0
-    current_user_request: Optional[str] = None
-    current_app_context_file: Optional[str] = None
-    current_ui_elements: Optional[List] = None
-    current_use_ui_elements: bool = True
-
-# Global memory state instance
-memory_state = MemoryState() 
\ No newline at end of file
+import contextvars
+from contextlib import contextmanager
+from source.hierarchy_store import HierarchySnapshotStore
+from source.tracing import MetricsRegistry
+
+class RunContext:
+    """Execution state of one automation run, passed explicitly through planning and execution"""
+    __slots__ = (
+        "current_plan",
+        "current_step_index",
+        "failed_nav_fallbacks",
+        "current_user_request",
+        "current_app_context_file",
+        "current_ui_elements",
+        "current_use_ui_elements",
+        "hierarchy_store",
+        "current_package",
+        "pending_locators",
+        "executed_steps",
+        "llm_enabled",
+        "metrics",
+    )
+
+    def __init__(self, current_plan=None, current_step_index=0, failed_nav_fallbacks=0,
+                 current_user_request=None, current_app_context_file=None, current_ui_elements=None,
+                 current_use_ui_elements=True, hierarchy_store=None, current_package=None, llm_enabled=True):
+        self.current_plan = current_plan
+        self.current_step_index = current_step_index
+        self.failed_nav_fallbacks = failed_nav_fallbacks
+        self.current_user_request = current_user_request
+        self.current_app_context_file = current_app_context_file
+        self.current_ui_elements = current_ui_elements
+        self.current_use_ui_elements = current_use_ui_elements
+        self.hierarchy_store = hierarchy_store if hierarchy_store is not None else HierarchySnapshotStore()
+        self.current_package = current_package
+        # Fallback steps awaiting success: id(step) -> (screen fingerprint, original target)
+        self.pending_locators = {}
+        # Steps that succeeded in this run, in order (extract steps carry their "answer")
+        self.executed_steps = []
+        # False in replay mode: planning and fallbacks never call the LLM
+        self.llm_enabled = llm_enabled
+        # Span aggregates for this run (device actions, dumps, screenshots, LLM calls)
+        self.metrics = MetricsRegistry()
+
+    def __repr__(self):
+        return (f"RunContext(request={self.current_user_request!r}, "
+                f"step={self.current_step_index}, plan_steps={len(self.current_plan or [])})")
+
+# Backwards-compatible name for the old dataclass
+MemoryState = RunContext
+
+# === Compatibility Shim ===
+# Code that still reads the module-level `memory_state` sees the context bound to
+# the current thread/task, or a default context for single interactive runs.
+_default_context = RunContext()
+_bound_context = contextvars.ContextVar("run_context", default=None)
+
+def current_context():
+    """Return the run context bound to the current thread/task, or the default one."""
+    context = _bound_context.get()
+    return context if context is not None else _default_context
+
+@contextmanager
+def use_context(ctx):
+    """Bind a run context to the current thread/task so `memory_state` resolves to it."""
+    token = _bound_context.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _bound_context.reset(token)
+
+# Older names for the binding helpers
+current_memory_state = current_context
+use_memory_state = use_context
+
+class _MemoryStateProxy:
+    """Forwards attribute access to whichever RunContext is bound to the caller."""
+
+    def __getattr__(self, name):
+        return getattr(current_context(), name)
+
+    def __setattr__(self, name, value):
+        setattr(current_context(), name, value)
+
+# Global memory state handle; resolves to the caller's bound context
+memory_state = _MemoryStateProxy()
\ No newline at end of file
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from source.logger import logger
+from source.config import PLAN_CACHE_DIR, PLAN_CACHE_TTL, PLAN_CACHE_MAX_ENTRIES
+
+def _normalize_text(text):
+    """Collapse whitespace so formatting-only differences hash identically."""
+    return " ".join((text or "").split())
+
+def ui_elements_fingerprint(ui_elements):
+    """Stable hash of an extracted UI element list (order-insensitive)."""
+    if not ui_elements:
+        return "none"
+    rows = sorted(json.dumps(el, sort_keys=True, separators=(",", ":")) for el in ui_elements)
+    return hashlib.sha256("\n".join(rows).encode("utf-8")).hexdigest()
+
+class PlanCache:
+    """Persistent content-addressed cache of generated plans with TTL and LRU eviction.
+
+    Each entry lives in its own JSON file named after its key. The file mtime
+    tracks the last access, which drives LRU eviction once the cache grows
+    beyond max_entries.
+    """
+
+    def __init__(self, cache_dir=PLAN_CACHE_DIR, ttl=PLAN_CACHE_TTL, max_entries=PLAN_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, model, system_prompt, user_request, ui_elements=None):
+        """Build the cache key from the normalized inputs of a plan request."""
+        payload = json.dumps([
+            model,
+            _normalize_text(system_prompt),
+            _normalize_text(user_request),
+            ui_elements_fingerprint(ui_elements),
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached plan for key, or None on a miss or expired entry."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            except Exception as e:
+                logger.warning(f"⚠️ Dropping unreadable plan cache entry {path}: {e}")
+                self._remove(path)
+                self.misses += 1
+                return None
+
+            if self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl:
+                self._remove(path)
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            # Touch the entry so LRU eviction sees it as recently used
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            self.hits += 1
+            return entry.get("plan")
+
+    def put(self, key, plan):
+        """Store a plan under key and evict least recently used entries if needed."""
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                path = self._path(key)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"created": time.time(), "plan": plan}, f)
+                os.replace(tmp_path, path)
+                self._evict()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not write plan cache entry: {e}")
+
+    def _evict(self):
+        entries = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".json")
+        ]
+        overflow = len(entries) - self.max_entries
+        if overflow <= 0:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:overflow]:
+            self._remove(path)
+            self.evictions += 1
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """Return hit/miss/eviction counters."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+# Global plan cache instance
+plan_cache = PlanCache()
@@ -1,16 +1,50 @@
-import time
 import re
 from source.logger import logger
 from source.screenshot_manager import take_screenshot
 from source.gpt_fallback import gpt_fallback, gpt_fallback_action
-from source.memory_state import memory_state
+from source.memory_state import current_context
+from source.ui_idle import wait_for_idle
+from source.hierarchy_store import capture_hierarchy, dump_hierarchy
+from source.locator_cache import locator_memory
+from source.screen_graph import get_screen_graph
+from source.element_matcher import match_element, selector_for
+from source.xpath_engine import document_for
+from source.tracing import span, traced, use_metrics
+from source.text_extractor import extract_from_hierarchy, answer_from_screen, extraction_stats
+from source.config import SCREEN_GRAPH_ENABLED, TEXT_EXTRACT_ENABLED
 
 # === Action Handlers ===
-def handle_click_action(d, target):
-    """Handle click action with text and xpath support"""
+def step_snapshot(d, ctx):
+    """Hierarchy snapshot for the current step, dumping the device at most once per step"""
+    latest = ctx.hierarchy_store.latest
+    if latest is not None and latest.step == ctx.current_step_index:
+        return latest
+    snapshot, _ = capture_hierarchy(d, ctx.hierarchy_store, ctx.current_step_index)
+    return snapshot
+
+def settled_snapshot(d, ctx):
+    """Wait briefly for the screen to settle and record it as the current step's snapshot"""
+    xml_str = wait_for_idle(d, site="step") or dump_hierarchy(d)
+    ctx.hierarchy_store.record(xml_str, ctx.current_step_index)
+    return ctx.hierarchy_store.latest
+
+@traced("action.click")
+def handle_click_action(d, target, ctx=None):
+    """Handle click action with text and xpath support
+
+    With a run context the target is first resolved locally against the step's
+    cached dump and clicked by coordinates; the device-side selectors below are
+    only used when it is not on that dump (e.g. still loading).
+    """
     if not target:
         return False
     
+    if ctx is not None:
+        found = document_for(step_snapshot(d, ctx)).find(target)
+        if found.exists and found.center:
+            d.click(*found.center)
+            return True
+    
     if target.startswith("text="):
         text_val = target.replace("text=", "").strip("'\"")
         if d(text=text_val).exists(timeout=5):
@@ -33,6 +67,7 @@ def handle_click_action(d, target):
     
     return False
 
+@traced("action.type")
 def handle_type_action(d, value):
     """Handle type action"""
     try:
@@ -42,45 +77,95 @@ def handle_type_action(d, value):
         logger.warning(f"⚠️ Type action failed: {e}")
         return False
 
-def handle_wait_action(d, target):
+@traced("action.wait")
+def handle_wait_action(d, target, ctx=None):
     """Handle wait action"""
     if not target or not target.startswith("xpath="):
         return False
     
+    if ctx is not None and document_for(step_snapshot(d, ctx)).find(target).exists:
+        return True
+    
     xpath_val = target.replace("xpath=", "")
     return d.xpath(xpath_val).wait(timeout=10)
 
-def handle_extract_action(d, query, step_index):
-    """Handle extract action - always screenshot-based with scrolling"""
-    logger.info(f"📸 Starting screenshot-based extraction")
-    logger.info(f"   User request: '{memory_state.current_user_request}'")
+@traced("action.extract")
+def handle_extract_action(d, query, step_index, ctx):
+    """Handle extract action - hierarchy text first, then screenshot-based with scrolling"""
+    logger.info(f"🔎 Starting extraction")
+    logger.info(f"   User request: '{ctx.current_user_request}'")
     logger.info(f"   Step query: '{query}'")
     
-    # Combine user request and step query for better context
-    combined_query = f"User wants: {memory_state.current_user_request}. Specifically looking for: {query}"
+    # Let the app finish rendering before reading the screen
+    logger.info("⏳ Waiting for the screen to settle before extracting...")
+    xml_str = wait_for_idle(d, site="extract") or dump_hierarchy(d)
+    ctx.hierarchy_store.record(xml_str, step_index)
     
-    # Wait 2 seconds before first screenshot to let app render
-    logger.info("⏳ Waiting 5 seconds before first screenshot...")
-    time.sleep(5)
+    # Prices, ETAs and times are usually plain text in the hierarchy: no screenshot needed
+    if TEXT_EXTRACT_ENABLED:
+        found = extract_from_hierarchy(d, query, ctx.current_user_request, ctx.current_app_context_file,
+                                       ctx.hierarchy_store.latest.nodes)
+        if found:
+            return _extracted(found.tier, found.answer)
+    
+    # Combine user request and step query for better context
+    combined_query = f"User wants: {ctx.current_user_request}. Specifically looking for: {query}"
     
     # Take initial screenshot and use GPT fallback with scrolling
+    logger.info(f"📸 Escalating to screenshot-based extraction")
     ss = take_screenshot(d, f"step_{step_index+1}_extract")
-    result = gpt_fallback(d, combined_query, memory_state.current_app_context_file, ss)
+    result = gpt_fallback(d, combined_query, ctx.current_app_context_file, ss)
     
     if result:
-        logger.info(f"✅ Extracted Value: {result}")
-        return result
+        return _extracted("vision", result)
     else:
+        extraction_stats.record(None)
         logger.warning(f"⚠️ No answer found for: '{combined_query}' after scrolling")
+        logger.info(f"📊 Extraction tiers: {extraction_stats.summary()}")
         return None
 
-def handle_fallback(d, step, step_index):
+def _extracted(tier, answer):
+    """Count the tier that answered and log the running tier totals."""
+    extraction_stats.record(tier)
+    logger.info(f"✅ Extracted Value ({tier}): {answer}")
+    logger.info(f"📊 Extraction tiers: {extraction_stats.summary()}")
+    return answer
+
+def replay_extract(d, step, step_index, ctx):
+    """Replay an extract step: read the live screen with the local text tiers, else serve the recorded answer"""
+    xml_str = wait_for_idle(d, site="extract") or dump_hierarchy(d)
+    ctx.hierarchy_store.record(xml_str, step_index)
+    recorded = step.get("answer")
+    found = answer_from_screen(step.get("query"), ctx.current_user_request, ctx.hierarchy_store.latest.nodes)
+    if found:
+        if found.answer != recorded:
+            logger.warning(f"📼 Live screen shows '{found.answer}', recorded answer was '{recorded}'")
+        return found.answer
+    logger.info(f"📼 Replaying recorded answer: {recorded}")
+    return recorded
+
+def screen_changes(d, step_index, ctx):
+    """What the screen did since the previous step ran, as prompt lines ("" when there is nothing to compare)"""
+    if step_index == 0 or ctx.hierarchy_store.snapshot_at(step_index - 1) is None:
+        return ""
+    step_snapshot(d, ctx)
+    diff = ctx.hierarchy_store.diff_since(step_index - 1)
+    if diff.is_empty:
+        return f"The screen did not change after step {step_index}."
+    return f"Screen changes since step {step_index} ({diff.summary()}):\n{diff.to_prompt()}"
+
+@traced("action.fallback")
+def handle_fallback(d, step, step_index, ctx):
     """Handle fallback logic for failed actions"""
-    if memory_state.failed_nav_fallbacks >= 2:
+    if not ctx.llm_enabled:
+        logger.warning("⚠️ LLM calls are disabled for this run, no fallback for the failed step")
+        return None, False
+    
+    if ctx.failed_nav_fallbacks >= 2:
         # Switch to extraction fallback after too many navigation failures
         logger.info("🔄 Too many navigation failures, switching to extraction fallback!")
         ss = take_screenshot(d, f"step_{step_index+1}_extract_fallback")
-        suggestion = gpt_fallback(d, memory_state.current_user_request, memory_state.current_app_context_file, ss)
+        suggestion = gpt_fallback(d, ctx.current_user_request, ctx.current_app_context_file, ss)
         logger.info(f"🤖 GPT Extracted: {suggestion}")
         if suggestion:
             logger.info(f"✅ Final Result: {suggestion}")
@@ -90,15 +175,12 @@ def handle_fallback(d, step, step_index):
         ss = take_screenshot(d, f"step_{step_index+1}_{step.get('action', 'unknown')}_fallback")
         
         # Fresh UI extraction for fallback
-        fresh_ui_elements = None
-        if memory_state.current_use_ui_elements:
-            from source.filter_ui_elements import extract_ui_elements
-            xml_str = d.dump_hierarchy(compressed=True)
-            fresh_ui_elements = extract_ui_elements(xml_str)
+        fresh_ui_elements = get_fresh_ui_elements(d, ctx, step_index)
         
         suggestion = gpt_fallback_action(
-            d, memory_state.current_user_request, memory_state.current_app_context_file, 
-            f"Step {step_index+1}: {step}", fresh_ui_elements, memory_state.current_use_ui_elements, ss
+            d, ctx.current_user_request, ctx.current_app_context_file, 
+            f"Step {step_index+1}: {step}", fresh_ui_elements, ctx.current_use_ui_elements, ss,
+            ctx=ctx, screen_changes=screen_changes(d, step_index, ctx)
         )
         logger.info(f"🤖 GPT Fallback Suggestion: {suggestion}")
         
@@ -109,25 +191,93 @@ def handle_fallback(d, step, step_index):
     
     return None, False
 
-def get_fresh_ui_elements(d):
-    """Get fresh UI elements if enabled"""
-    if not memory_state.current_use_ui_elements:
+def get_fresh_ui_elements(d, ctx, step_index=None):
+    """Get fresh UI elements if enabled, reusing the last parse when the screen is unchanged"""
+    if not ctx.current_use_ui_elements:
+        return None
+    
+    snapshot, _ = capture_hierarchy(d, ctx.hierarchy_store, step_index)
+    return snapshot.ui_elements()
+
+def try_learned_locator(d, target, ctx):
+    """Replay a selector that resolved this target on the same screen in an earlier run.
+
+    Returns (selector that was clicked or None, screen fingerprint); the fingerprint is
+    reused to learn from a later fallback.
+    """
+    if not target or not ctx.current_package:
+        return None, None
+    
+    snapshot = step_snapshot(d, ctx)
+    with span("cache.locator") as s:
+        selector = locator_memory.lookup(ctx.current_package, snapshot.fingerprint, target)
+        s.set(cache="hit" if selector is not None else "miss")
+    if selector is None:
+        return None, snapshot.fingerprint
+    
+    logger.info(f"🧠 Trying learned locator for {target}: {selector}")
+    if handle_click_action(d, selector, ctx):
+        locator_memory.record_success(ctx.current_package, snapshot.fingerprint, target, selector)
+        return selector, snapshot.fingerprint
+    
+    logger.warning(f"⚠️ Learned locator no longer works: {selector}")
+    locator_memory.record_failure(ctx.current_package, snapshot.fingerprint, target)
+    return None, snapshot.fingerprint
+
+def try_local_match(d, target, ctx):
+    """Fuzzy-match a failed click target against the current hierarchy and tap the best candidate.
+
+    Returns the selector of the tapped node (the original target if it has no usable one), or None.
+    """
+    if not target:
+        return None
+    
+    match = match_element(target, step_snapshot(d, ctx).nodes)
+    if match is None:
         return None
     
-    from source.filter_ui_elements import extract_ui_elements
-    xml_str = d.dump_hierarchy(compressed=True)
-    return extract_ui_elements(xml_str)
+    node = match.node
+    label = node.text or node.content_desc or node.hint or node.resource_id
+    logger.info(f"🎯 Local match for {target}: '{label}' ({node.class_name}, score {match.score:.2f})")
+    d.click(*match.center)
+    return selector_for(node) or target
+
+def follow_transition(graph, ctx, screen, segment, snapshot):
+    """Record the move from screen through segment to the snapshot's screen. Returns the new (screen, segment)."""
+    if snapshot is None or snapshot.fingerprint == screen:
+        return screen, segment
+    graph.record_transition(screen, segment, snapshot.fingerprint, ctx.current_user_request)
+    return snapshot.fingerprint, []
 
 # === Main Executor ===
-def execute_plan(d):
-    """Execute the automation plan with fallback handling"""
+def execute_plan(d, ctx=None):
+    """Execute the run context's plan with fallback handling, then log the run's timing summary"""
+    if ctx is None:
+        ctx = current_context()
+    with use_metrics(ctx.metrics):
+        try:
+            return _run_plan(d, ctx)
+        finally:
+            logger.info("📊 Run timing summary:\n%s", ctx.metrics.summary_table())
+
+def _run_plan(d, ctx):
     i = 0
-    memory_state.failed_nav_fallbacks = 0  # Reset failed navigation fallbacks
-    memory_state.current_step_index = 0
+    ctx.failed_nav_fallbacks = 0  # Reset failed navigation fallbacks
+    ctx.current_step_index = 0
+    ctx.pending_locators.clear()
+    ctx.executed_steps = []
+    
+    # Screen graph recording: the current screen and the steps run on it so far
+    graph = get_screen_graph(ctx.current_package) if SCREEN_GRAPH_ENABLED and ctx.current_package else None
+    latest = ctx.hierarchy_store.latest
+    screen = latest.fingerprint if latest else None
+    segment = []
+    # A click/type ran since the screen was last read: the next step's snapshot is the "after" screen
+    moved = False
     
-    while i < len(memory_state.current_plan):
-        step = memory_state.current_plan[i]
-        memory_state.current_step_index = i
+    while i < len(ctx.current_plan):
+        step = ctx.current_plan[i]
+        ctx.current_step_index = i
         logger.info(f"\n➡️ Step {i+1}: {step}")
         
         action = step.get("action")
@@ -135,23 +285,51 @@ def execute_plan(d):
         value = step.get("value")
         query = step.get("query")
         
+        # Extract steps settle the screen themselves; every other step reuses this settled snapshot
+        if moved and action != "extract":
+            screen, segment = follow_transition(graph, ctx, screen, segment, settled_snapshot(d, ctx))
+            moved = False
+        
         success = False
+        failed_screen = None
+        executed = step  # what actually ran, e.g. with the selector a local fallback clicked
         
         # Handle different action types
         if action == "click":
-            success = handle_click_action(d, target)
+            success = handle_click_action(d, target, ctx)
+            # Replay must not substitute a different element for a recorded click
+            if not success and target and ctx.llm_enabled:
+                # The device-side wait timed out: dump once more and share it with both local fallbacks
+                capture_hierarchy(d, ctx.hierarchy_store, i)
+                # Try what worked on this screen before, ahead of any LLM call
+                selector, failed_screen = try_learned_locator(d, target, ctx)
+                if selector is None:
+                    # Fuzzy-match against the current hierarchy before escalating to the vision LLM
+                    selector = try_local_match(d, target, ctx)
+                if selector is not None:
+                    success = True
+                    executed = {**step, "target": selector}
             
         elif action == "type":
             success = handle_type_action(d, value)
             
         elif action == "wait":
-            success = handle_wait_action(d, target)
+            success = handle_wait_action(d, target, ctx)
             if not success:
                 logger.warning("⚠️ Step failed: Wait failed: XPath not visible")
             
         elif action == "extract":
-            result = handle_extract_action(d, query, i)
+            if ctx.llm_enabled:
+                result = handle_extract_action(d, query, i, ctx)
+            else:
+                result = replay_extract(d, step, i, ctx)
+            if moved:
+                screen, segment = follow_transition(graph, ctx, screen, segment, ctx.hierarchy_store.snapshot_at(i))
+                moved = False
             if result is not None:
+                ctx.executed_steps.append({**step, "answer": result})
+                if graph is not None:
+                    graph.record_goal(ctx.current_user_request, screen, segment + [step])
                 return result  # Early exit with extracted value
             success = True  # Consider extract as "successful" even if it falls back to GPT
             
@@ -161,20 +339,38 @@ def execute_plan(d):
         
         # Handle failures with fallback logic
         if not success:
-            memory_state.failed_nav_fallbacks += 1
-            fallback_result, should_exit = handle_fallback(d, step, i)
+            if not ctx.llm_enabled:
+                # Replay has no fallbacks: a failed step means the recorded route is broken
+                logger.warning(f"📼 Step {i+1} failed during replay, the recorded route no longer works")
+                return None
+            ctx.failed_nav_fallbacks += 1
+            fallback_result, should_exit = handle_fallback(d, step, i, ctx)
             
             if should_exit:
+                ctx.executed_steps.append({"action": "extract", "query": ctx.current_user_request, "answer": fallback_result})
                 return fallback_result  # Early exit
             
             if fallback_result:
-                memory_state.current_plan.insert(i+1, fallback_result)  # Insert suggestion for next iteration
+                ctx.current_plan.insert(i+1, fallback_result)  # Insert suggestion for next iteration
+                if failed_screen and fallback_result.get("action") == "click":
+                    # Learn the suggestion as this target's locator once it succeeds
+                    ctx.pending_locators[id(fallback_result)] = (failed_screen, target)
             
             i += 1
             continue
         else:
-            memory_state.failed_nav_fallbacks = 0  # Reset on success
+            ctx.failed_nav_fallbacks = 0  # Reset on success
+            ctx.executed_steps.append(dict(executed))
+            pending = ctx.pending_locators.pop(id(step), None)
+            if pending:
+                locator_memory.record_success(ctx.current_package, pending[0], pending[1], target)
+            if graph is not None and action in ("click", "type"):
+                segment.append(executed)
+                moved = True
         
         i += 1
     
+    if moved:
+        ctx.current_step_index = i
+        follow_transition(graph, ctx, screen, segment, settled_snapshot(d, ctx))
     return None  # No result found 
\ No newline at end of file
@@ -1,8 +1,13 @@
 import json
 import re
-import openai
 from source.logger import logger
-from source.memory_state import memory_state
+from source.app_context import app_contexts
+from source.memory_state import current_context
+from source.config import PLAN_MODEL, PLAN_CACHE_BYPASS
+from source.plan_cache import plan_cache
+from source.prompt_encoder import encode_ui_elements
+from source.llm_client import get_llm_client
+from source.tracing import span
 
 def parse_plan(plan):
     """Parse plan and remove wait actions that come right before extract actions"""
@@ -31,67 +36,61 @@ def parse_plan(plan):
     
     return parsed_plan
 
-def generate_plan():
-    """Generate a step-by-step automation plan using GPT."""
-    logger.info(f"🧠 Generating plan for: '{memory_state.current_user_request}'")
-    # Read UI text from app context if available
-    ui_text = ""
-    try:
-        with open(memory_state.current_app_context_file, "r", encoding="utf-8") as f:
-            ui_text = f.read()
-    except Exception as e:
-        logger.warning(f"⚠️ Could not read {memory_state.current_app_context_file}: {e}")
-    
-    # Add UI elements context if available
-    ui_elements_context = ""
-    if memory_state.current_use_ui_elements and memory_state.current_ui_elements:
-        ui_elements_context = f"\n\nCurrent UI Elements Available:\n{json.dumps(memory_state.current_ui_elements, indent=2)}"
-        logger.info(f"📱 Using {len(memory_state.current_ui_elements)} UI elements for planning")
-    
-    system_prompt = f"""
-You are a mobile automation planner. The following is a basic flow overview of how major functions work in the app:
-{ui_text}{ui_elements_context}
+def load_plan_json(raw):
+    """Decode a plan from raw LLM output, tolerating a markdown code fence. Raises ValueError."""
+    if raw.startswith("```"):
+        raw = re.sub(r"```(json)?", "", raw).strip("`")
+    return json.loads(raw)
 
-ALWAYS generate a step-by-step plan for navigating the app using uiautomator2 to achieve what the user is asking for.
-If you can't complete the plan, generate a fallback plan that will help the user to complete the task or give them information closest to what they are asking for.
-BUT **ALWAYS** GENERATE A PLAN.
+def generate_plan(ctx=None, bypass_cache=PLAN_CACHE_BYPASS):
+    """Generate a step-by-step automation plan using GPT for the given run context.
 
-Each step should be:
-- Directly mappable to uiautomator2 methods
-- Written in JSON format like:
-[
-  {{ "action": "click", "target": "xpath=//android.widget.TextView[contains(@text, 'Search')]" }},
-  {{ "action": "type", "value": "Wireless Headphones" }},
-  {{ "action": "click", "target": "xpath=//android.widget.TextView[contains(@text, 'Wireless Headphones')]" }},
-  {{ "action": "wait", "target": "xpath=//android.widget.TextView[contains(@text, '$')]" }},
-  {{ "action": "extract", "query": "find the price of Wireless Headphones" }}
-]
-
-IMPORTANT: For extraction steps, use "query" field with natural language instead of "target" with XPath. The extraction will use screenshot analysis with scrolling to find the information.
+    Plans are served from the on-disk plan cache when the model, prompt, user
+    request and UI elements match an earlier run. With bypass_cache the lookup
+    is skipped and the fresh plan overwrites the cached one.
+    """
+    if ctx is None:
+        ctx = current_context()
+    if not ctx.llm_enabled:
+        logger.warning("⚠️ LLM calls are disabled for this run, not generating a plan")
+        return []
+    logger.info(f"🧠 Generating plan for: '{ctx.current_user_request}'")
+    # Static system prompt precompiled per app; UI elements go into the user message
+    template = app_contexts.template(ctx.current_app_context_file, "plan")
+    ui_elements_context = ""
+    if ctx.current_use_ui_elements and ctx.current_ui_elements:
+        encoded = encode_ui_elements(ctx.current_ui_elements, ctx.current_user_request)
+        ui_elements_context = f"Current UI Elements Available:\n{encoded.text}\n\nUser request: "
+        logger.info(f"📱 Using {len(ctx.current_ui_elements)} UI elements for planning")
 
-Valid actions: "click", "type", "wait", "extract"
-For extract: use "query" field with natural language description of what to find
+    cache_key = plan_cache.make_key(
+        PLAN_MODEL, template.system, ctx.current_user_request,
+        ctx.current_ui_elements if ctx.current_use_ui_elements else None
+    )
+    if not bypass_cache:
+        with span("cache.plan") as s:
+            cached_plan = plan_cache.get(cache_key)
+            s.set(cache="hit" if cached_plan is not None else "miss")
+        if cached_plan is not None:
+            stats = plan_cache.stats()
+            logger.info(f"💾 Plan cache hit ({stats['hits']} hits / {stats['misses']} misses)")
+            return cached_plan
+        logger.info("💾 Plan cache miss, calling LLM")
 
-Only output valid JSON array — no markdown or explanations.
-"""
-    response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            { "role": "system", "content": system_prompt },
-            { "role": "user", "content": memory_state.current_user_request }
-        ],
+    raw = get_llm_client().chat(
+        model=PLAN_MODEL,
+        messages=template.messages(ui_elements=ui_elements_context, user_request=ctx.current_user_request),
         max_tokens=500,
         temperature=0.2
     )
-
-    raw = response.choices[0].message.content.strip()
     logger.info("🪵 Raw LLM output:\n" + raw)
 
     try:
-        # Auto-fix if wrapped in code block
-        if raw.startswith("```"):
-            raw = re.sub(r"```(json)?", "", raw).strip("`")
-        return json.loads(raw)
+        plan = load_plan_json(raw)
     except Exception as e:
         logger.error(f"❌ Plan parsing failed: {e}")
-        return [] 
\ No newline at end of file
+        return []
+
+    if plan:
+        plan_cache.put(cache_key, plan)
+    return plan 
\ No newline at end of file
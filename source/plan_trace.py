@@ -0,0 +1,54 @@
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+from source.logger import logger
+
+# Bump when the trace layout changes; older traces are rejected instead of misread
+TRACE_VERSION = 1
+
+@dataclass
+class PlanTrace:
+    """Recorded run that can be replayed step for step without any LLM calls.
+
+    steps holds only the steps that succeeded, in execution order, including
+    fallback steps inserted at run time; extract steps carry their "answer".
+    plan is the final plan as it stood at the end of the run, for reference.
+    """
+    app: str
+    package: str
+    user_request: str
+    steps: List[dict] = field(default_factory=list)
+    plan: List[dict] = field(default_factory=list)
+    result: Optional[str] = None
+    recorded_at: float = 0.0
+    version: int = TRACE_VERSION
+
+def trace_from_context(ctx, app, result):
+    """Build a trace from a finished run context."""
+    return PlanTrace(
+        app=app,
+        package=ctx.current_package,
+        user_request=ctx.current_user_request,
+        steps=[dict(step) for step in ctx.executed_steps],
+        plan=[dict(step) for step in ctx.current_plan or []],
+        result=result,
+        recorded_at=time.time(),
+    )
+
+def save_trace(trace, path):
+    """Write a trace as JSON."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(asdict(trace), f, indent=2, ensure_ascii=False)
+    logger.info(f"📼 Recorded {len(trace.steps)} steps to {path}")
+
+def load_trace(path):
+    """Read a trace written by save_trace. Raises ValueError for unsupported versions."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    version = data.get("version")
+    if version != TRACE_VERSION:
+        raise ValueError(f"Unsupported trace version {version!r} in {path} (expected {TRACE_VERSION})")
+    return PlanTrace(**data)
@@ -0,0 +1,167 @@
+import json
+from dataclasses import dataclass, field
+from typing import List
+from source.logger import logger, LazyJSON
+from source.app_context import app_contexts
+from source.config import PLAN_MODEL
+from source.element_matcher import match_element, selector_for
+from source.llm_client import get_llm_client
+from source.plan_generator import load_plan_json, parse_plan
+from source.prompt_encoder import encode_ui_elements
+from source.xpath_engine import document_for, to_xpath, xpath_syntax_error
+
+VALID_ACTIONS = ("click", "type", "wait", "extract")
+
+@dataclass
+class PlanIssue:
+    """One problem found in a plan step"""
+    index: int
+    step: object
+    reason: str
+
+    def describe(self):
+        return f"Step {self.index + 1} {json.dumps(self.step)}: {self.reason}"
+
+@dataclass
+class ValidationReport:
+    """Outcome of validating (and possibly repairing) a plan"""
+    plan: list
+    issues: List[PlanIssue] = field(default_factory=list)
+    fixed_locally: int = 0
+    repaired: bool = False
+
+# === Static Checks ===
+def check_step(step):
+    """Return the schema/XPath problem with a single step, or None if it is well formed."""
+    if not isinstance(step, dict):
+        return "step is not an object"
+    action = step.get("action")
+    if action not in VALID_ACTIONS:
+        return f"unknown action {action!r}"
+    if action == "type":
+        return None if isinstance(step.get("value"), str) and step["value"] else "type step needs a non-empty 'value'"
+    if action == "extract":
+        return None if isinstance(step.get("query"), str) and step["query"] else "extract step needs a 'query'"
+
+    target = step.get("target")
+    if not isinstance(target, str) or not target:
+        return f"{action} step needs a 'target'"
+    if action == "wait" and not target.startswith("xpath="):
+        return "wait target must be an xpath= selector"
+    expression = to_xpath(target)
+    if expression is None:
+        return "target must start with text= or xpath="
+    error = xpath_syntax_error(expression)
+    return f"invalid XPath: {error}" if error else None
+
+def check_plan(plan):
+    """Static pass: action schemas and XPath compilation for every step."""
+    if not isinstance(plan, list):
+        return [PlanIssue(-1, plan, "plan is not a JSON array")]
+    issues = []
+    for index, step in enumerate(plan):
+        reason = check_step(step)
+        if reason:
+            issues.append(PlanIssue(index, step, reason))
+    return issues
+
+# === Dynamic Checks ===
+def check_against_screen(plan, snapshot, skip=()):
+    """Dynamic pass: resolve the opening click target against the current screen.
+
+    Only a click that opens the plan runs on this screen: a wait or type step
+    before it may change what is shown, and later targets belong to screens
+    not seen yet. A missing target that the local fuzzy matcher can
+    resolve is rewritten in place. Returns (issues, fixed).
+    """
+    first = plan[0] if plan else None
+    if not isinstance(first, dict) or first.get("action") != "click" or 0 in skip:
+        return [], 0
+    target = first["target"]
+    if document_for(snapshot).find(target).exists:
+        return [], 0
+    match = match_element(target, snapshot.nodes)
+    selector = selector_for(match.node) if match else None
+    if selector:
+        logger.info(f"🩹 Step 1: {target} not on screen, using {selector} (score {match.score:.2f})")
+        first["target"] = selector
+        return [], 1
+    return [PlanIssue(0, first, "target not found on the current screen")], 0
+
+# === Batched Repair ===
+def repair_plan(plan, issues, ctx):
+    """Ask the LLM once to fix every flagged step. Returns the repaired plan, or None."""
+    ui_block = ""
+    if ctx.current_ui_elements:
+        encoded = encode_ui_elements(ctx.current_ui_elements, ctx.current_user_request)
+        ui_block = f"UI elements on the current screen:\n{encoded.text}\n\n"
+    template = app_contexts.template(ctx.current_app_context_file, "repair")
+    raw = get_llm_client().chat(
+        model=PLAN_MODEL,
+        messages=template.messages(
+            ui_elements=ui_block, user_request=ctx.current_user_request,
+            plan=json.dumps(plan, indent=2), problems="\n".join(issue.describe() for issue in issues)
+        ),
+        max_tokens=600,
+        temperature=0
+    )
+    try:
+        repaired = load_plan_json(raw)
+    except Exception as e:
+        logger.error(f"❌ Plan repair parsing failed: {e}")
+        return None
+    if check_plan(repaired):
+        logger.warning("⚠️ Repaired plan still has schema errors, ignoring it")
+        return None
+    return repaired
+
+def validate_plan(plan, ctx, snapshot=None, repair=True):
+    """
+    Validate a plan before execution and fix what can be fixed up front.
+    Args:
+        plan: parsed plan (list of step dicts)
+        ctx: RunContext (UI elements and request feed the repair prompt)
+        snapshot: hierarchy snapshot of the current screen for the dynamic pass
+        repair: send one batched repair request for the remaining issues
+    Returns:
+        ValidationReport whose plan is the one to execute
+    """
+    issues = check_plan(plan)
+    if issues and issues[0].index < 0:
+        return ValidationReport(plan, issues)
+
+    fixed = 0
+    if snapshot is not None:
+        screen_issues, fixed = check_against_screen(plan, snapshot, skip={issue.index for issue in issues})
+        issues += screen_issues
+
+    report = ValidationReport(plan, issues, fixed)
+    if not issues:
+        logger.info(f"✅ Plan validated ({len(plan)} steps, {fixed} fixed locally)")
+        return report
+
+    for issue in issues:
+        logger.warning(f"⚠️ Plan issue: {issue.describe()}")
+    if not repair or not ctx.llm_enabled:
+        return report
+
+    logger.info(f"🛠️ Requesting one batched repair for {len(issues)} plan issue(s)")
+    try:
+        repaired = repair_plan(plan, issues, ctx)
+    except Exception as e:
+        logger.error(f"❌ Plan repair request failed, keeping the original plan: {e}")
+        repaired = None
+    if repaired:
+        repaired = parse_plan(repaired)
+        remaining = check_plan(repaired)
+        if snapshot is not None and not remaining:
+            remaining, _ = check_against_screen(repaired, snapshot)
+        if remaining:
+            for issue in remaining:
+                logger.warning(f"⚠️ Repaired plan issue: {issue.describe()}")
+            logger.warning("⚠️ Repaired plan still fails validation, keeping the original plan")
+            return report
+        report.plan = repaired
+        report.repaired = True
+        logger.info("🛠️ Repaired plan:\n%s", LazyJSON(repaired))
+    return report
@@ -0,0 +1,149 @@
+import json
+import re
+from dataclasses import dataclass
+from source.logger import logger
+from source.config import PLAN_MODEL, UI_PROMPT_TOKEN_BUDGET, UI_PROMPT_INCLUDE_BOUNDS
+
+_tiktoken = None  # imported on first count; False when it is not installed
+_encoders = {}
+_scaffolds = {}  # (model, key layout) -> tokens of one element's JSON keys and punctuation
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+# === Token Counting ===
+def count_tokens(text, model=PLAN_MODEL):
+    """Count prompt tokens with the local tiktoken encoder (approximate if tiktoken is missing)."""
+    global _tiktoken
+    if _tiktoken is None:
+        try:
+            import tiktoken as _tiktoken
+        except ImportError:  # Fall back to a word/punctuation estimate
+            _tiktoken = False
+    tiktoken = _tiktoken
+    if not tiktoken:
+        return len(_WORD_RE.findall(text))
+    encoder = _encoders.get(model)
+    if encoder is None:
+        try:
+            encoder = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoder = tiktoken.get_encoding("o200k_base")
+        _encoders[model] = encoder
+    return len(encoder.encode(text))
+
+# === Compact Element Encoding ===
+HEADER = "class|text|hint|content_desc|resource_id|flags"
+LEGEND = "flags: c=clickable f=focusable l=long-clickable x=disabled"
+
+def _cell(value):
+    return value.replace("|", "/").replace("\n", " ").strip()
+
+def _flags(element):
+    flags = ""
+    if element.get("clickable"):
+        flags += "c"
+    if element.get("focusable"):
+        flags += "f"
+    if element.get("long_clickable"):
+        flags += "l"
+    if not element.get("enabled", True):
+        flags += "x"
+    return flags
+
+def _row(element, include_bounds):
+    cells = [
+        element.get("class", "").rsplit(".", 1)[-1],
+        _cell(element.get("text", "")),
+        _cell(element.get("hint", "")),
+        _cell(element.get("content_desc", "")),
+        element.get("resource_id", "").split(":id/", 1)[-1],
+        _flags(element),
+    ]
+    if include_bounds:
+        cells.append(element.get("bounds", ""))
+    return "|".join(cells).rstrip("|")
+
+def _scaffold_tokens(element, model):
+    """Tokens one element spends on JSON keys and punctuation, counted once per key layout and model."""
+    layout = tuple((key, value if isinstance(value, (bool, type(None))) else "") for key, value in element.items())
+    tokens = _scaffolds.get((model, layout))
+    if tokens is None:
+        tokens = count_tokens(json.dumps(dict(layout), indent=2), model)
+        _scaffolds[(model, layout)] = tokens
+    return tokens
+
+def _relevance(element, query_words):
+    """Score an element by word overlap with the request, nudging inputs and clickables up."""
+    haystack = " ".join((
+        element.get("text", ""), element.get("hint", ""),
+        element.get("content_desc", ""), element.get("resource_id", "").replace("_", " "),
+    )).lower()
+    words = set(re.findall(r"\w+", haystack))
+    score = len(words & query_words) * 10
+    if "EditText" in element.get("class", ""):
+        score += 3
+    if element.get("clickable"):
+        score += 1
+    if not words:
+        score -= 2  # Unlabelled containers are rarely what the model needs
+    return score
+
+@dataclass
+class EncodedElements:
+    """Compact UI element block for a prompt, with its token accounting"""
+    text: str
+    tokens_before: int  # estimated cost of the same elements as indented JSON
+    tokens_after: int
+    kept: int
+    total: int
+
+def encode_ui_elements(ui_elements, query="", token_budget=UI_PROMPT_TOKEN_BUDGET,
+                       include_bounds=UI_PROMPT_INCLUDE_BOUNDS, model=PLAN_MODEL):
+    """
+    Encode UI elements as deduplicated pipe-separated rows ranked by relevance and fitted to a token budget.
+    Args:
+        ui_elements: element dicts from extract_ui_elements
+        query: user request / failed step used to rank elements
+        token_budget: maximum tokens for the encoded block (None for no limit)
+        include_bounds: append the bounds column
+        model: model whose tokenizer is used for counting
+    Returns:
+        EncodedElements; kept rows stay in screen order
+    """
+    rows = []
+    costs = {}  # row -> tokens, +1 for the newline
+    tokens_before = 2  # the list brackets
+    for position, element in enumerate(ui_elements or []):
+        row = _row(element, include_bounds)
+        # The JSON baseline is estimated from the row tokens instead of serializing and counting it
+        if row not in costs:
+            costs[row] = count_tokens(row, model) + 1
+            rows.append((position, row, element))
+        tokens_before += costs[row] + _scaffold_tokens(element, model)
+
+    header = f"{HEADER}{'|bounds' if include_bounds else ''}  ({LEGEND})"
+    query_words = set(re.findall(r"\w+", (query or "").lower()))
+    ranked = sorted(rows, key=lambda item: (-_relevance(item[2], query_words), item[0]))
+
+    used = count_tokens(header, model)
+    kept = []
+    for position, row, _ in ranked:
+        cost = costs[row]
+        if token_budget is not None and used + cost > token_budget:
+            continue
+        kept.append((position, row))
+        used += cost
+    kept.sort()
+
+    text = "\n".join([header] + [row for _, row in kept])
+    encoded = EncodedElements(
+        text=text,
+        tokens_before=tokens_before,
+        tokens_after=count_tokens(text, model),
+        kept=len(kept),
+        total=len(ui_elements or []),
+    )
+    logger.info(
+        f"🧮 UI elements prompt: ~{encoded.tokens_before} → {encoded.tokens_after} tokens "
+        f"(kept {encoded.kept}/{encoded.total} elements)"
+    )
+    return encoded
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from source.logger import logger
+from source.config import SCREEN_GRAPH_DIR
+
+def _normalize_request(user_request):
+    return " ".join((user_request or "").lower().split())
+
+def _clean_step(step):
+    return {k: v for k, v in step.items() if k in ("action", "target", "value", "query")}
+
+def _edge_key(steps):
+    return json.dumps(steps, sort_keys=True)
+
+class ScreenGraph:
+    """Persistent graph of (screen, steps) -> screen transitions for one app package.
+
+    Nodes are screen fingerprints; edges are the step sequences observed to move
+    between them (steps that leave the screen unchanged, such as typing, stay
+    attached to the step that finally navigates). Goals remember, per user
+    request, the screen where the answer was extracted and the steps run there,
+    so a known route can be replayed without LLM planning.
+    """
+
+    def __init__(self, package, directory=SCREEN_GRAPH_DIR):
+        self.package = package
+        self.path = os.path.join(directory, f"{package}.json")
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read screen graph {self.path}, starting empty: {e}")
+            data = {}
+        self.edges = data.get("edges", {})
+        self.goals = data.get("goals", {})
+
+    def record_transition(self, before, steps, after, user_request=None):
+        """Record that running steps on screen `before` led to screen `after`."""
+        if not before or not after or before == after or not steps:
+            return
+        steps = [_clean_step(step) for step in steps]
+        edge = {"steps": steps, "to": after, "updated": time.time()}
+        if any(step.get("action") == "type" for step in steps):
+            # Typed values are request-specific; only replay them for the same request
+            edge["request"] = _normalize_request(user_request)
+        with self._lock:
+            edges = self.edges.setdefault(before, {})
+            previous = edges.get(_edge_key(steps))
+            edge["count"] = previous["count"] + 1 if previous and previous["to"] == after else 1
+            edges[_edge_key(steps)] = edge
+            self._dirty = True
+
+    def record_goal(self, user_request, screen, tail_steps):
+        """Remember where a request was answered and the steps that answered it there."""
+        if not screen:
+            return
+        with self._lock:
+            self.goals[_normalize_request(user_request)] = {
+                "screen": screen, "tail": [_clean_step(step) for step in tail_steps], "updated": time.time()
+            }
+            self._dirty = True
+
+    def shortest_path(self, start, goal, user_request=None):
+        """Breadth-first search for the fewest steps from start to goal. Returns a step list or None."""
+        if start == goal:
+            return []
+        request = _normalize_request(user_request)
+        with self._lock:
+            parents = {start: None}
+            frontier = deque([start])
+            while frontier:
+                screen = frontier.popleft()
+                for edge in self.edges.get(screen, {}).values():
+                    if "request" in edge and edge["request"] != request:
+                        continue
+                    target = edge["to"]
+                    if target in parents:
+                        continue
+                    parents[target] = (screen, edge["steps"])
+                    if target == goal:
+                        segments = []
+                        while parents[target] is not None:
+                            target, steps = parents[target]
+                            segments.append(steps)
+                        return [dict(step) for steps in reversed(segments) for step in steps]
+                    frontier.append(target)
+        return None
+
+    def plan_for(self, start, user_request):
+        """Build a full plan for a known request from the current screen, or None if the route is unknown."""
+        goal = self.goals.get(_normalize_request(user_request))
+        if not goal or not start:
+            return None
+        path = self.shortest_path(start, goal["screen"], user_request)
+        if path is None:
+            return None
+        return path + [dict(step) for step in goal["tail"]]
+
+    def save(self):
+        """Write the graph to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"version": 1, "package": self.package, "edges": self.edges, "goals": self.goals}, f, indent=1)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except Exception as e:
+                logger.warning(f"⚠️ Could not write screen graph {self.path}: {e}")
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+def get_screen_graph(package):
+    """Return the shared ScreenGraph for a package, loading it on first use."""
+    with _graphs_lock:
+        graph = _graphs.get(package)
+        if graph is None:
+            graph = _graphs[package] = ScreenGraph(package)
+        return graph
@@ -1,15 +1,213 @@
+import atexit
+import base64
+import io
 import os
+import queue
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
+from typing import NamedTuple, Optional
 from source.logger import logger
+from source.config import (FRAME_HASH_SIZE, FRAME_HASH_SKIP_TOP, FRAME_DUPLICATE_THRESHOLD,
+                           FRAME_ANSWER_CACHE_SIZE, SCREENSHOT_PERSIST)
+from source.tracing import span
+from source.scroll_planner import content_signature
 
 SCREENSHOT_DIR = "screenshots"
 
-def take_screenshot(d, label="fallback"):
-    """Take a screenshot and save it to the screenshots directory."""
-    os.makedirs(SCREENSHOT_DIR, exist_ok=True)
-    timestamp = datetime.now().strftime("%H%M%S")
-    path = os.path.join(SCREENSHOT_DIR, f"{label}_{timestamp}.png")
-    d.screenshot(path)
-    logger.info(f"📸 Screenshot saved: {path}")
-    logger.info(f"🖼️ Screenshot size: {os.path.getsize(path) / 1024:.2f} KB")
-    return path 
\ No newline at end of file
+@dataclass
+class Screenshot:
+    """An encoded screenshot held in memory"""
+    data: bytes
+    label: str
+    mime_type: str = "image/png"
+    path: Optional[str] = None
+
+    @property
+    def size_kb(self):
+        return len(self.data) / 1024
+
+def _detect_mime_type(data):
+    """Guess the image type from its magic bytes."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+
+# === Background Persistence ===
+class _ScreenshotWriter:
+    """Writes screenshots to disk on a daemon thread so capture never blocks on file I/O."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="screenshot-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def submit(self, path, data):
+        self._ensure_started()
+        self._queue.put((path, data))
+
+    def flush(self):
+        """Block until every queued screenshot has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            path, data = self._queue.get()
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(data)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not save screenshot {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+_writer = _ScreenshotWriter()
+
+def flush_screenshots():
+    """Wait for pending background screenshot writes to finish."""
+    _writer.flush()
+
+def take_screenshot(d, label="fallback", persist=SCREENSHOT_PERSIST):
+    """Capture the screen into memory, optionally saving a copy in the background."""
+    with span("device.screenshot") as s:
+        data = d.screenshot(format="raw")
+        s.set(bytes=len(data))
+    shot = Screenshot(data=data, label=label, mime_type=_detect_mime_type(data))
+    if persist:
+        timestamp = datetime.now().strftime("%H%M%S")
+        shot.path = os.path.join(SCREENSHOT_DIR, f"{label}_{timestamp}.{_EXTENSIONS[shot.mime_type]}")
+        _writer.submit(shot.path, data)
+    logger.info(f"📸 Screenshot captured: {label} ({shot.size_kb:.2f} KB)")
+    return shot
+
+def to_data_url(data, mime_type="image/png"):
+    """Base64-encode image bytes (or a memoryview) into a data URL for vision requests."""
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+# === Perceptual Frame Keys ===
+class FrameKey(NamedTuple):
+    """What a frame shows: a difference hash of its pixels and, when known, its hierarchy content"""
+    visual: int
+    content: Optional[str] = None
+
+def frame_key(image, nodes=None, hash_size=FRAME_HASH_SIZE, skip_top=FRAME_HASH_SKIP_TOP):
+    """
+    Perceptual key of a frame below the status bar, so a ticking clock or battery icon does not change it.
+    Args:
+        image: Screenshot, encoded bytes or PIL image
+        nodes: parsed hierarchy shown in the frame; rows of a uniform list can look
+            alike at hash resolution, but their text and bounds never do
+        hash_size: dHash grid size (hash_size² bits)
+        skip_top: fraction of the height taken by the status bar
+    Returns:
+        FrameKey, or None if the image could not be read (callers treat it as a new frame)
+    """
+    try:
+        from PIL import Image  # deferred with the other heavy imports
+        if isinstance(image, Screenshot):
+            image = image.data
+        if not isinstance(image, Image.Image):
+            image = Image.open(io.BytesIO(image))
+        width, height = image.size
+        image.draft("L", (hash_size * 8, hash_size * 8))  # let the JPEG decoder downscale
+        scale = image.size[1] / height
+        image = image.crop((0, int(height * skip_top * scale), image.size[0], image.size[1]))
+        small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+        pixels = small.tobytes()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not hash screenshot: {e}")
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    content = content_signature(nodes, (0, int(height * skip_top), width, height)) if nodes else None
+    return FrameKey(value, content)
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+def is_near_duplicate(a, b, threshold=FRAME_DUPLICATE_THRESHOLD):
+    """Check whether two frame keys describe the same screen.
+
+    The pixel hashes must be within the threshold, and the hierarchy content must
+    match whenever both frames have it.
+    """
+    if a is None or b is None:
+        return False
+    if a.content and b.content and a.content != b.content:
+        return False
+    return hamming_distance(a.visual, b.visual) <= threshold
+
+class FrameAnswerCache:
+    """LRU cache of extraction answers keyed by (query, frame key).
+
+    Lookups match any stored frame within the near-duplicate threshold, so a
+    re-rendered screen (new clock, blinking cursor) reuses the earlier answer.
+    Negative results (None) are cached as well to skip repeated vision calls
+    on frames already known not to contain the answer.
+    """
+
+    def __init__(self, max_entries=FRAME_ANSWER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize_query(query):
+        return " ".join((query or "").lower().split())
+
+    def get(self, query, key):
+        """Return (hit, answer) for a query on a frame; the closest stored frame wins."""
+        if key is None:
+            return False, None
+        query = self._normalize_query(query)
+        with self._lock:
+            best, best_distance = None, None
+            for entry in self._entries:
+                cached_query, cached_key = entry
+                if cached_query == query and is_near_duplicate(cached_key, key):
+                    distance = hamming_distance(cached_key.visual, key.visual)
+                    if best is None or distance < best_distance:
+                        best, best_distance = entry, distance
+            if best is not None:
+                self._entries.move_to_end(best)
+                self.hits += 1
+                return True, self._entries[best]
+            self.misses += 1
+            return False, None
+
+    def put(self, query, key, answer):
+        """Store the answer (or None for not found) for a query on a frame."""
+        if key is None:
+            return
+        with self._lock:
+            entry = (self._normalize_query(query), key)
+            self._entries[entry] = answer
+            self._entries.move_to_end(entry)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+# Global extraction answer cache instance
+frame_answer_cache = FrameAnswerCache()
\ No newline at end of file
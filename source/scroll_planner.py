@@ -0,0 +1,137 @@
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from source.logger import logger
+from source.filter_ui_elements import parse_ui_nodes
+from source.hierarchy_store import dump_hierarchy
+from source.ui_idle import wait_for_idle
+from source.tracing import span
+from source.config import SCROLL_SWIPE_FROM, SCROLL_SWIPE_TO, SCROLL_SWIPE_DURATION, SCROLL_MIN_CONTAINER_HEIGHT
+
+@dataclass
+class SwipePlan:
+    """One swipe inside a scrollable container (or the whole window when there is none)"""
+    start: Tuple[int, int]
+    end: Tuple[int, int]
+    container: Optional[Tuple[int, int, int, int]]
+
+def _device_key(d):
+    return getattr(d, "serial", None) or id(d)
+
+def scroll_container(nodes, window=None, min_height=SCROLL_MIN_CONTAINER_HEIGHT):
+    """Largest scrollable node tall enough to be a vertical list (carousels are skipped), or None.
+
+    Without a window size every scrollable node counts, whatever its height.
+    """
+    best, best_area = None, 0
+    for node in nodes:
+        if not node.scrollable or not node.bounds:
+            continue
+        x1, y1, x2, y2 = node.bounds
+        if window and y2 - y1 < window[1] * min_height:
+            continue
+        if (x2 - x1) * (y2 - y1) > best_area:
+            best, best_area = node.bounds, (x2 - x1) * (y2 - y1)
+    return best
+
+def plan_swipe(nodes, window, backward=False):
+    """
+    Compute the swipe vector for one page of scrolling.
+    Args:
+        nodes: parsed nodes of the current screen
+        window: (width, height) of the device screen
+        backward: swipe down to go back up the list
+    Returns:
+        SwipePlan within the scroll container, kept clear of the screen edges
+    """
+    width, height = window
+    container = scroll_container(nodes, window)
+    x1, y1, x2, y2 = container or (0, 0, width, height)
+    x = (x1 + x2) // 2
+    # Stay off the status bar and the gesture navigation area
+    low, high = int(height * 0.05), int(height * 0.95)
+    start_y = min(max(int(y1 + (y2 - y1) * SCROLL_SWIPE_FROM), low), high)
+    end_y = min(max(int(y1 + (y2 - y1) * SCROLL_SWIPE_TO), low), high)
+    if backward:
+        start_y, end_y = end_y, start_y
+    return SwipePlan((x, start_y), (x, end_y), container)
+
+def content_signature(nodes, container):
+    """Identity of what is shown inside the container; unchanged after a swipe means the end of the list.
+
+    Returns None when no node lies inside the container (e.g. a WebView without
+    accessible children), since the content cannot be compared then.
+    """
+    cx1, cy1, cx2, cy2 = container
+    rows = [
+        (node.resource_id, node.text, node.content_desc, node.raw_bounds) for node in nodes
+        if node.bounds and cx1 <= node.bounds[0] and cy1 <= node.bounds[1]
+        and node.bounds[2] <= cx2 and node.bounds[3] <= cy2
+    ]
+    if not rows:
+        return None
+    return hashlib.sha1(repr(rows).encode("utf-8")).hexdigest()
+
+class ScrollPlanner:
+    """Swipes the scrollable container found in the hierarchy and detects the end of the list.
+
+    Window sizes are cached per device. Callers pass the nodes returned by
+    their previous swipe to plan the next one, so only a swipe without them
+    needs its own dump.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._window_sizes = {}
+
+    def window_size(self, d):
+        """Screen size of the device, queried once per device."""
+        key = _device_key(d)
+        with self._lock:
+            size = self._window_sizes.get(key)
+        if size is None:
+            size = tuple(d.window_size())
+            with self._lock:
+                self._window_sizes[key] = size
+        return size
+
+    def forget(self, d):
+        """Drop cached state for a device (e.g. after a rotation)."""
+        key = _device_key(d)
+        with self._lock:
+            self._window_sizes.pop(key, None)
+
+    def scroll(self, d, scroll_turn, backward=False, nodes=None):
+        """
+        Swipe one page inside the scroll container and wait for the content to settle.
+        Args:
+            d: uiautomator2 device object
+            scroll_turn: index of this swipe within the caller's loop
+            backward: scroll back towards the top
+            nodes: parsed nodes of the screen as it is now (e.g. the previous swipe's result);
+                dumped when None
+        Returns:
+            Parsed nodes of the settled page, or None when the content did not move
+            (end of the list); a container whose content cannot be read counts as moved
+        """
+        if nodes is None:
+            nodes = parse_ui_nodes(dump_hierarchy(d))
+
+        plan = plan_swipe(nodes, self.window_size(d), backward)
+        with span("device.swipe", backward=backward, container=plan.container is not None):
+            logger.info(f"📱 Scrolling: {plan.start} → {plan.end}"
+                        + (f" in {plan.container}" if plan.container else " (no scroll container)"))
+            d.swipe(*plan.start, *plan.end, duration=SCROLL_SWIPE_DURATION)
+        settled = wait_for_idle(d, site="scroll") or dump_hierarchy(d)
+        after = parse_ui_nodes(settled)
+
+        region = plan.container or (0, 0) + self.window_size(d)
+        signature = content_signature(after, region)
+        if signature is not None and signature == content_signature(nodes, region):
+            logger.info(f"🛑 Content did not move on scroll {scroll_turn + 1}, end of the list")
+            return None
+        return after
+
+# Process-wide planner (window sizes are cached per device serial)
+scroll_planner = ScrollPlanner()
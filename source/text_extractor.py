@@ -0,0 +1,304 @@
+import json
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from source.logger import logger
+from source.app_context import app_contexts
+from source.element_matcher import normalize, text_similarity
+from source.gpt_fallback import scroll_page
+from source.scroll_planner import scroll_planner
+from source.hierarchy_stitcher import HierarchyStitcher, stitch_pages
+from source.llm_client import get_llm_client
+from source.tracing import span
+from source.config import TEXT_EXTRACT_MODEL, TEXT_EXTRACT_MAX_SCROLLS, TEXT_EXTRACT_MIN_SCORE, TEXT_EXTRACT_MAX_ROWS
+
+TIERS = ("regex", "semantic", "llm_text", "vision")
+
+# === Value Patterns ===
+VALUE_PATTERNS = {
+    "currency": re.compile(r"(?:[₹$€£]|\bRs\.?|\bINR|\bUSD)\s?\d[\d,]*(?:\.\d{1,2})?|\d[\d,]*(?:\.\d{1,2})?\s?(?:₹|\bINR\b|\bUSD\b)", re.IGNORECASE),
+    "duration": re.compile(r"\b\d+(?:\s?[-–]\s?\d+)?\s?(?:min|mins|minutes|hr|hrs|hour|hours)\b", re.IGNORECASE),
+    "time": re.compile(r"\b(?:[01]?\d|2[0-3]):[0-5]\d(?:\s?[ap]\.?m\b\.?)?|\b(?:1[0-2]|0?[1-9])\s?[ap]\.?m\b\.?", re.IGNORECASE),
+}
+
+# Query words that ask for each kind of value (matched against normalized query tokens)
+_KIND_KEYWORDS = {
+    "currency": {"price", "prices", "cost", "costs", "fare", "fares", "amount", "total", "charge", "charges",
+                 "fee", "fees", "rate", "much", "expensive", "cheap", "cheapest", "rs", "inr", "rupees", "dollars"},
+    "duration": {"eta", "long", "duration", "minutes", "mins", "min", "away", "delivery", "wait", "waiting"},
+    "time": {"time", "clock", "arrival", "arrive", "arrives", "drop", "dropoff", "reach", "when"},
+}
+_CURRENCY_SYMBOLS = ("₹", "$", "€", "£")
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "at", "by", "is", "are", "was", "what", "whats", "which",
+    "how", "find", "get", "extract", "show", "tell", "me", "my", "please", "current", "value", "and", "or",
+    "user", "wants", "specifically", "looking", "it", "this", "that", "will", "be", "take", "does", "do", "from",
+}
+
+def wanted_kinds(query):
+    """Value kinds ("currency", "duration", "time") a query asks for, in VALUE_PATTERNS order."""
+    tokens = set(normalize(query).split())
+    kinds = [kind for kind, keywords in _KIND_KEYWORDS.items() if tokens & keywords]
+    if "currency" not in kinds and any(symbol in (query or "") for symbol in _CURRENCY_SYMBOLS):
+        kinds.insert(0, "currency")
+    return tuple(kind for kind in VALUE_PATTERNS if kind in kinds)
+
+def query_subject(query):
+    """What the query is about with question words and value keywords removed ("price of UberX" -> "uberx")."""
+    keywords = set().union(*_KIND_KEYWORDS.values())
+    return " ".join(token for token in normalize(query).split() if token not in _STOPWORDS and token not in keywords)
+
+def find_values(text, kinds):
+    """Substrings of text that look like values of the wanted kinds, in kind order."""
+    if not text:
+        return []
+    values = []
+    for kind in kinds:
+        values += [match.group(0).strip() for match in VALUE_PATTERNS[kind].finditer(text)]
+    return values
+
+# === Screen Text ===
+def _labels(node):
+    return [label for label in (node.text, node.content_desc) if label]
+
+def _contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+def screen_rows(nodes):
+    """Group text/content-desc labels into visual rows (top to bottom, cells left to right)."""
+    cells = []
+    for node in nodes:
+        if not node.bounds:
+            continue
+        for label in _labels(node):
+            cells.append((node.bounds, " ".join(label.split())))
+    cells.sort(key=lambda cell: (cell[0][1], cell[0][0]))
+
+    rows, current, band = [], [], None
+    for bounds, label in cells:
+        center = (bounds[1] + bounds[3]) // 2
+        if band is not None and band[0] <= center <= band[1]:
+            if label not in current:
+                current.append(label)
+            continue
+        if current:
+            rows.append(" | ".join(current))
+        current, band = [label], (bounds[1], bounds[3])
+    if current:
+        rows.append(" | ".join(current))
+    return rows
+
+class _ContextIndex:
+    """Containers and visual rows of one dump, built once so each candidate's context is a lookup."""
+
+    def __init__(self, nodes):
+        bounded = [node for node in nodes if node.bounds]
+        # Smallest containers first, so the first hit around a node is its row
+        self.containers = sorted(bounded, key=lambda c: (c.bounds[2] - c.bounds[0]) * (c.bounds[3] - c.bounds[1]))
+        self.labelled = [(node, _labels(node)) for node in bounded if _labels(node)]
+        self.by_center = sorted(((node.bounds[1] + node.bounds[3]) // 2, i) for i, (node, _) in enumerate(self.labelled))
+        self._inside = {}
+
+    def labels(self, node):
+        """Labels of the smallest container around node that holds other text (e.g. one list row)."""
+        for container in self.containers:
+            if container is node or container.bounds == node.bounds or not _contains(container.bounds, node.bounds):
+                continue
+            labels = [label for other, other_labels in self._labelled_in(container)
+                      if other is not node for label in other_labels]
+            labels += _labels(container)
+            if labels:
+                return labels
+        # No container with text: fall back to labels on the same visual row
+        start = bisect_left(self.by_center, (node.bounds[1], -1))
+        end = bisect_right(self.by_center, (node.bounds[3], len(self.labelled)))
+        return [label for _, i in self.by_center[start:end] if self.labelled[i][0] is not node
+                for label in self.labelled[i][1]]
+
+    def _labelled_in(self, container):
+        inside = self._inside.get(container.bounds)
+        if inside is None:
+            inside = [(other, labels) for other, labels in self.labelled if _contains(container.bounds, other.bounds)]
+            self._inside[container.bounds] = inside
+        return inside
+
+@dataclass
+class TextAnswer:
+    """A value found in hierarchy text and the tier that found it"""
+    answer: str
+    tier: str
+    score: float = 1.0
+
+def match_on_screen(nodes, kinds, subject, min_score=TEXT_EXTRACT_MIN_SCORE):
+    """
+    Pattern and proximity tiers on one parsed dump.
+    Args:
+        nodes: UIElement records of the dump
+        kinds: value kinds from wanted_kinds()
+        subject: query subject from query_subject() ("" when the query names none)
+        min_score: minimum subject similarity of a value's own label or its surroundings
+    Returns:
+        TextAnswer, or None when no value (or more than one equally good value) was found
+    """
+    if not kinds:
+        return None
+    candidates = []  # (node, label, first value in the label)
+    for node in nodes:
+        for label in _labels(node):
+            values = find_values(label, kinds)
+            if values:
+                candidates.append((node, label, values[0]))
+    if not candidates:
+        return None
+
+    # Regex tier: the only value on screen, or the value whose own label best matches the subject
+    if not subject:
+        distinct = {value for _, _, value in candidates}
+        return TextAnswer(candidates[0][2], "regex") if len(distinct) == 1 else None
+    scored = [(text_similarity(subject, label), value) for _, label, value in candidates]
+    if any(score >= min_score for score, _ in scored):
+        return _best(scored, subject, "regex", min_score)
+
+    # Semantic tier: score each value by how well its surrounding row matches the subject
+    index = _ContextIndex(nodes)
+    scored = []
+    for node, label, value in candidates:
+        if not node.bounds:
+            continue
+        context = index.labels(node)
+        scored.append((max((text_similarity(subject, other) for other in context), default=0.0), value))
+    return _best(scored, subject, "semantic", min_score)
+
+def _best(scored, subject, tier, min_score):
+    """The best-scoring value at or above min_score, or None when another value scores within 0.05 of it."""
+    scored = sorted((item for item in scored if item[0] >= min_score), key=lambda item: -item[0])
+    if not scored:
+        return None
+    best_score, best_value = scored[0]
+    if any(value != best_value and best_score - score < 0.05 for score, value in scored[1:]):
+        logger.info(f"🔤 Ambiguous values near '{subject}': {[value for _, value in scored[:4]]}")
+        return None
+    return TextAnswer(best_value, tier, best_score)
+
+# === Text-Only LLM Tier ===
+_DIGITS_RE = re.compile(r"\d+")
+
+def _grounded(answer, rows):
+    """True when every number in the answer occurs in the screen text (guards against made-up values)."""
+    text = " ".join(rows).replace(",", "")
+    return all(number in text for number in _DIGITS_RE.findall(answer.replace(",", "")))
+
+def ask_text_model(query, rows, app_context_file):
+    """Ask the cheap text-only model for the value using the collected screen text. Returns the answer or None."""
+    template = app_contexts.template(app_context_file, "extract_text")
+    raw = get_llm_client().chat(
+        model=TEXT_EXTRACT_MODEL,
+        messages=template.messages(user_request=query, rows="\n".join(rows[:TEXT_EXTRACT_MAX_ROWS])),
+        max_tokens=100,
+        temperature=0
+    )
+    if raw.startswith("```"):
+        raw = re.sub(r"```[a-zA-Z]*", "", raw).strip("`").strip()
+    try:
+        result = json.loads(raw)
+    except json.JSONDecodeError:
+        logger.warning(f"⚠️ Text extraction returned non-JSON response: {raw}")
+        return None
+    answer = str(result.get("answer") or "").strip()
+    if not result.get("found") or not answer or answer.lower() == "not_found":
+        return None
+    if not _grounded(answer, rows):
+        logger.warning(f"⚠️ Text extraction answer '{answer}' is not in the screen text, ignoring it")
+        return None
+    return answer
+
+# === Orchestration ===
+def extract_from_hierarchy(d, query, user_request, app_context_file, nodes, max_scrolls=TEXT_EXTRACT_MAX_SCROLLS):
+    """
+    Answer an extract step from hierarchy text before any screenshot is taken.
+    Args:
+        d: uiautomator2 device object
+        query: the step's natural-language query
+        user_request: the run's user request (subject fallback and LLM context)
+        app_context_file: path to app context file for the text-only prompt
+        nodes: parsed nodes of the current (settled) screen
+        max_scrolls: maximum swipes through the results list
+    Returns:
+        TextAnswer, or None to escalate to vision (after scrolling back to the start)
+    """
+    kinds, subject = _query_terms(query, user_request)
+    logger.info(f"🔤 Text-first extraction: kinds={list(kinds) or '-'} subject='{subject}'")
+
+    # Scrolled pages are stitched into one list, so each query runs once over every row seen so far
+    stitcher = HierarchyStitcher(window=scroll_planner.window_size(d))
+    stitcher.add_page(nodes)
+    found = _match_stitched(stitcher, kinds, subject)
+    if found is None:
+        for _ in stitch_pages(d, stitcher, scroll_page, max_scrolls, nodes):
+            found = _match_stitched(stitcher, kinds, subject)
+            if found:
+                break
+    if found:
+        logger.info(f"✅ {found.tier} tier found '{found.answer}' after {stitcher.scrolls} scroll(s) (score {found.score:.2f})")
+        return found
+
+    rows = screen_rows(stitcher.nodes)
+    if rows:
+        try:
+            answer = ask_text_model(f"{user_request}. Specifically looking for: {query}", rows, app_context_file)
+        except Exception as e:
+            logger.error(f"❌ Text extraction request failed: {e}")
+            answer = None
+        if answer:
+            logger.info(f"✅ llm_text tier found '{answer}' in {len(rows)} text rows over {stitcher.pages} page(s)")
+            return TextAnswer(answer, "llm_text")
+
+    # Vision starts from the screen the step began on
+    page = None
+    for turn in range(stitcher.scrolls):
+        page = scroll_page(d, turn, backward=True, nodes=page)
+        if page is None:
+            break
+    return None
+
+def answer_from_screen(query, user_request, nodes):
+    """Regex and semantic tiers on one screen only: no scrolling and no LLM call."""
+    kinds, subject = _query_terms(query, user_request)
+    return match_on_screen(nodes, kinds, subject)
+
+def _query_terms(query, user_request):
+    return wanted_kinds(f"{query} {user_request}"), query_subject(query) or query_subject(user_request)
+
+def _match_stitched(stitcher, kinds, subject):
+    with span("extract.match", nodes=len(stitcher)) as s:
+        found = match_on_screen(stitcher.nodes, kinds, subject)
+        s.set(cache="hit" if found else "miss")
+    return found
+
+# === Tier Counters ===
+class ExtractionStats:
+    """Counts which tier answered each extract step (or that none did)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.answered = dict.fromkeys(TIERS, 0)
+        self.unanswered = 0
+
+    def record(self, tier):
+        """Record the tier that answered, or None when no tier did."""
+        with self._lock:
+            if tier is None:
+                self.unanswered += 1
+            else:
+                self.answered[tier] += 1
+
+    def summary(self):
+        with self._lock:
+            total = sum(self.answered.values()) + self.unanswered
+            parts = [f"{tier} {count}" for tier, count in self.answered.items()]
+            return f"{', '.join(parts)}, none {self.unanswered} (of {total})"
+
+# Process-wide counters across runs
+extraction_stats = ExtractionStats()
@@ -0,0 +1,119 @@
+import contextvars
+import functools
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from source.logger import LazyJSON, trace_logger
+from source.config import TRACE_ENABLED
+
+# === Metrics Registry ===
+class MetricsRegistry:
+    """Aggregates finished spans by name: count, durations, bytes, tokens and cache outcomes."""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def add(self, name, duration, attrs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = {
+                    "count": 0, "total": 0.0, "max": 0.0, "bytes": 0, "tokens": 0, "hits": 0, "misses": 0
+                }
+            metric["count"] += 1
+            metric["total"] += duration
+            metric["max"] = max(metric["max"], duration)
+            metric["bytes"] += attrs.get("bytes", 0) or 0
+            metric["tokens"] += (attrs.get("prompt_tokens", 0) or 0) + (attrs.get("completion_tokens", 0) or 0)
+            cache = attrs.get("cache")
+            if cache == "hit":
+                metric["hits"] += 1
+            elif cache == "miss":
+                metric["misses"] += 1
+
+    def snapshot(self):
+        """Copy of the per-span-name aggregates."""
+        with self._lock:
+            return {name: dict(metric) for name, metric in self._metrics.items()}
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def summary_table(self):
+        """Render the aggregates as a text table, slowest total first."""
+        metrics = sorted(self.snapshot().items(), key=lambda item: -item[1]["total"])
+        lines = [f"{'span':<28} {'count':>6} {'total s':>8} {'mean ms':>8} {'max ms':>8} {'KB':>8} {'tokens':>7} {'cache h/m':>10}"]
+        for name, m in metrics:
+            cache = f"{m['hits']}/{m['misses']}" if m["hits"] or m["misses"] else "-"
+            lines.append(
+                f"{name[:28]:<28} {m['count']:>6} {m['total']:>8.2f} {m['total'] / m['count'] * 1000:>8.1f} "
+                f"{m['max'] * 1000:>8.1f} {m['bytes'] / 1024:>8.1f} {m['tokens']:>7} {cache:>10}"
+            )
+        return "\n".join(lines)
+
+_default_registry = MetricsRegistry()
+_bound_registry = contextvars.ContextVar("metrics_registry", default=None)
+
+def current_metrics():
+    """Return the registry bound to the current thread/task, or the process default."""
+    registry = _bound_registry.get()
+    return registry if registry is not None else _default_registry
+
+@contextmanager
+def use_metrics(registry):
+    """Bind a registry so spans in this thread/task (and contexts copied from it) land there."""
+    token = _bound_registry.set(registry)
+    try:
+        yield registry
+    finally:
+        _bound_registry.reset(token)
+
+# === Spans ===
+class Span:
+    """A timed operation; attach bytes, tokens, cache status etc. with set()."""
+    __slots__ = ("name", "attrs", "start", "duration")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block and record it to the bound metrics registry and the JSONL trace."""
+    current = Span(name, attrs)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        registry = current_metrics()
+        registry.add(name, current.duration, current.attrs)
+        if TRACE_ENABLED:
+            # Queued to the trace listener thread, which owns the rotating file
+            trace_logger.info("%s", LazyJSON({
+                "run": registry.run_id, "span": name, "ts": current.start,
+                "ms": round(current.duration * 1000, 3), "thread": threading.current_thread().name,
+                **current.attrs,
+            }, indent=None))
+
+def traced(name):
+    """Decorator form of span() for functions that need no extra attributes."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
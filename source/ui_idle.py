@@ -0,0 +1,89 @@
+import hashlib
+import time
+from source.logger import logger
+from source.config import IDLE_SETTINGS, IDLE_POLL_INTERVAL, IDLE_SCREENSHOT_TOLERANCE
+from source.hierarchy_store import dump_hierarchy
+from source.tracing import span
+
+# === Settle Signals ===
+def hierarchy_signature(xml_str):
+    """Cheap signature of a hierarchy dump, used to compare consecutive polls."""
+    return hashlib.sha1(xml_str.encode("utf-8")).hexdigest()
+
+def screen_thumbnail(d, size=32):
+    """Grab a tiny grayscale thumbnail of the screen as raw bytes."""
+    image = d.screenshot()
+    return image.convert("L").resize((size, size)).tobytes()
+
+def thumbnails_match(a, b, tolerance=IDLE_SCREENSHOT_TOLERANCE):
+    """Check whether two thumbnails differ by at most `tolerance` mean absolute difference."""
+    if a is None or b is None or len(a) != len(b):
+        return False
+    diff = sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+    return diff <= tolerance
+
+# === Idle Detection ===
+def wait_for_idle(d, site="scroll", timeout=None, stable_polls=None, interval=IDLE_POLL_INTERVAL,
+                  use_screenshot=False, require=None, clock=time.monotonic, sleep=time.sleep):
+    """
+    Block until the UI stops changing or the upper bound elapses.
+    Args:
+        d: uiautomator2 device object (only dump_hierarchy/screenshot are used)
+        site: call site name in IDLE_SETTINGS providing default timeout and stable polls
+        timeout: maximum seconds to wait (overrides the site default)
+        stable_polls: consecutive identical samples needed to call the screen settled
+        interval: seconds between polls
+        use_screenshot: also require screenshot thumbnails to be quiescent
+        require: optional predicate on the hierarchy XML that must hold before settling
+        clock, sleep: time sources, injectable for scripted fake devices
+    Returns:
+        The last hierarchy XML once the screen is stable, or None if the timeout elapsed first
+    """
+    default_timeout, default_polls = IDLE_SETTINGS.get(site, IDLE_SETTINGS["scroll"])
+    timeout = default_timeout if timeout is None else timeout
+    stable_polls = default_polls if stable_polls is None else stable_polls
+
+    with span(f"idle.{site}") as idle_span:
+        start = clock()
+        deadline = start + timeout
+        last_signature = None
+        last_thumbnail = None
+        stable_count = 0
+        polls = 0
+
+        while True:
+            polls += 1
+            try:
+                xml_str = dump_hierarchy(d)
+                thumbnail = screen_thumbnail(d) if use_screenshot else None
+            except Exception as e:
+                # Without a signal we cannot tell when the screen settles, so wait out the bound
+                logger.warning(f"⚠️ Idle detection failed ({site}): {e}")
+                remaining = deadline - clock()
+                if remaining > 0:
+                    sleep(remaining)
+                return None
+
+            signature = hierarchy_signature(xml_str)
+            same_screen = signature == last_signature
+            if use_screenshot:
+                same_screen = same_screen and thumbnails_match(thumbnail, last_thumbnail)
+            ready = require is None or require(xml_str)
+
+            if not ready:
+                stable_count = 0
+            else:
+                stable_count = stable_count + 1 if same_screen else 1
+            last_signature = signature
+            last_thumbnail = thumbnail
+
+            if stable_count >= stable_polls:
+                idle_span.set(settled=True, polls=polls)
+                logger.info(f"⏱️ UI settled ({site}) after {clock() - start:.2f}s")
+                return xml_str
+
+            if clock() + interval > deadline:
+                idle_span.set(settled=False, polls=polls)
+                logger.info(f"⏱️ UI did not settle ({site}) within {timeout:.1f}s")
+                return None
+            sleep(interval)
@@ -0,0 +1,117 @@
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from source.logger import logger
+from source.config import XPATH_DOCUMENT_CACHE_SIZE
+from source.filter_ui_elements import parse_bounds
+
+# Characters that cannot appear in an XML tag name (e.g. "$" in inner class names)
+_INVALID_TAG_CHARS = re.compile(r"[^\w.\-]")
+
+@dataclass
+class XPathResult:
+    """First node matched by a selector in a hierarchy dump"""
+    selector: str
+    exists: bool
+    bounds: Optional[Tuple[int, int, int, int]] = None
+    count: int = 0
+
+    @property
+    def center(self):
+        if not self.bounds:
+            return None
+        x1, y1, x2, y2 = self.bounds
+        return (x1 + x2) // 2, (y1 + y2) // 2
+
+def to_xpath(target):
+    """Turn a plan target ("text=..." or "xpath=...") into an XPath expression, or None."""
+    if not target:
+        return None
+    if target.startswith("xpath="):
+        return target[len("xpath="):]
+    if target.startswith("text="):
+        text = target[len("text="):].strip("'\"")
+        quoted = f"'{text}'" if "'" not in text else f'"{text}"'
+        return f"//*[@text={quoted}]"
+    return None
+
+# lxml is imported inside the functions that use it so importing this module stays cheap
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+def compile_xpath(expression):
+    """Compile an XPath expression once and reuse it. Raises etree.XPathSyntaxError."""
+    with _compiled_lock:
+        compiled = _compiled.get(expression)
+    if compiled is None:
+        from lxml import etree
+        compiled = etree.XPath(expression)
+        with _compiled_lock:
+            _compiled[expression] = compiled
+    return compiled
+
+def xpath_syntax_error(expression):
+    """Return why an XPath expression does not compile, or None if it does."""
+    from lxml import etree
+    try:
+        compile_xpath(expression)
+    except etree.XPathSyntaxError as e:
+        return str(e)
+    return None
+
+class HierarchyDocument:
+    """One hierarchy dump parsed with lxml for local XPath evaluation.
+
+    Like uiautomator2's xpath plugin, each <node> is renamed after its class so
+    selectors such as //android.widget.TextView[@text='Search'] match locally.
+    """
+
+    def __init__(self, xml_str):
+        from lxml import etree
+        data = xml_str.encode("utf-8") if isinstance(xml_str, str) else xml_str
+        self.root = etree.fromstring(data, parser=etree.XMLParser(recover=True, huge_tree=True))
+        for node in self.root.iter("node"):
+            class_name = node.get("class")
+            if class_name:
+                node.tag = _INVALID_TAG_CHARS.sub("-", class_name)
+
+    def find(self, target):
+        """Resolve one plan target. Invalid expressions resolve as missing."""
+        from lxml import etree
+        expression = to_xpath(target)
+        if expression is None:
+            return XPathResult(target, False)
+        try:
+            value = compile_xpath(expression)(self.root)
+        except (etree.XPathSyntaxError, etree.XPathEvalError) as e:
+            logger.warning(f"⚠️ Invalid XPath {expression}: {e}")
+            return XPathResult(target, False)
+        # Expressions that evaluate to a number/string/boolean select no nodes
+        matches = [m for m in value if isinstance(m, etree._Element)] if isinstance(value, list) else []
+        if not matches:
+            return XPathResult(target, False)
+        return XPathResult(target, True, parse_bounds(matches[0].get("bounds", "")), len(matches))
+
+    def resolve_many(self, targets):
+        """Resolve many targets against this single dump. Returns {target: XPathResult}."""
+        return {target: self.find(target) for target in targets}
+
+# === Per-Dump Cache ===
+_documents = OrderedDict()
+_documents_lock = threading.Lock()
+
+def document_for(snapshot):
+    """Return the parsed document for a hierarchy snapshot, reusing it for identical dumps."""
+    with _documents_lock:
+        document = _documents.get(snapshot.signature)
+        if document is not None:
+            _documents.move_to_end(snapshot.signature)
+            return document
+    document = HierarchyDocument(snapshot.xml)
+    with _documents_lock:
+        _documents[snapshot.signature] = document
+        while len(_documents) > XPATH_DOCUMENT_CACHE_SIZE:
+            _documents.popitem(last=False)
+    return document
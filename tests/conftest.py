@@ -0,0 +1,10 @@
+import os
+import pytest
+
+@pytest.fixture(scope="session", autouse=True)
+def _scratch_cwd(tmp_path_factory):
+    """Run from a scratch directory so logs/ and cache/ written by the agent stay out of the repo."""
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("run"))
+    yield
+    os.chdir(previous)
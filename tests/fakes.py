@@ -0,0 +1,77 @@
+"""Scripted stand-ins for uiautomator2 devices and the clock."""
+
+def node(text="", bounds=(0, 0, 0, 0), class_name="android.widget.TextView", resource_id="",
+         children="", scrollable=False, clickable=False):
+    """One <node> element of a hierarchy dump."""
+    x1, y1, x2, y2 = bounds
+    return (f'<node text="{text}" content-desc="" class="{class_name}" resource-id="{resource_id}" '
+            f'package="com.example" bounds="[{x1},{y1}][{x2},{y2}]" scrollable="{str(scrollable).lower()}" '
+            f'clickable="{str(clickable).lower()}" enabled="true">{children}</node>')
+
+def hierarchy(*nodes):
+    return "<hierarchy>" + "".join(nodes) + "</hierarchy>"
+
+class FakeClock:
+    """Monotonic clock that only advances when sleep() is called."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class _MissingSelector:
+    """d(text=...) that never finds anything."""
+
+    def exists(self, timeout=0):
+        return False
+
+class _MissingXPath:
+    """d.xpath(...) that never finds anything."""
+    exists = False
+
+    def wait(self, timeout=0):
+        return False
+
+class FakeDevice:
+    """Serves scripted hierarchy dumps and records taps and swipes.
+
+    dumps is a list of XML strings returned in order; the last one repeats.
+    """
+
+    def __init__(self, dumps, serial="fake-0", window=(1080, 2400)):
+        self.dumps = list(dumps)
+        self.serial = serial
+        self.window = window
+        self.dump_count = 0
+        self.clicks = []
+        self.swipes = []
+        self.started = []
+
+    def dump_hierarchy(self, compressed=True):
+        xml = self.dumps[min(self.dump_count, len(self.dumps) - 1)]
+        self.dump_count += 1
+        return xml
+
+    def window_size(self):
+        return self.window
+
+    def app_start(self, package):
+        self.started.append(package)
+
+    def click(self, x, y):
+        self.clicks.append((x, y))
+
+    def swipe(self, x1, y1, x2, y2, duration=None):
+        self.swipes.append((x1, y1, x2, y2))
+
+    def __call__(self, **selector):
+        return _MissingSelector()
+
+    def xpath(self, expression):
+        return _MissingXPath()
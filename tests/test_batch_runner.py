@@ -0,0 +1,61 @@
+import threading
+from source import batch_runner
+from source.memory_state import current_context
+from tests.fakes import FakeDevice
+
+def _cases(count):
+    return [batch_runner.TestCase("uber", f"price of ride {i}", expected=f"₹{100 + i}", name=f"case {i}")
+            for i in range(count)]
+
+def test_cases_are_sharded_across_devices_and_reported_in_suite_order():
+    cases = _cases(6)
+    devices = {serial: FakeDevice([""], serial=serial) for serial in ("emulator-1", "emulator-2")}
+    ran_on = {}
+    contexts = []
+    lock = threading.Lock()
+    both_started = threading.Barrier(2, timeout=5)
+
+    def run_case(d, app, prompt, ctx):
+        with lock:
+            first = d.serial not in ran_on
+            ran_on.setdefault(d.serial, []).append(prompt)
+            contexts.append(ctx)
+        if first:
+            both_started.wait()  # each device's first case waits until the other device is busy too
+        assert current_context() is ctx
+        return f"₹{100 + int(prompt.rsplit(' ', 1)[1])}"
+
+    report = batch_runner.run_suite(cases, list(devices), connect=devices.__getitem__, run_case=run_case)
+
+    assert [r.case for r in report.results] == cases
+    assert report.passed == 6
+    assert set(ran_on) == set(devices)
+    assert sum(len(prompts) for prompts in ran_on.values()) == 6
+    assert len({id(ctx) for ctx in contexts}) == 6  # every case runs in its own RunContext
+
+def test_failed_connection_and_errors_are_reported_per_case():
+    cases = _cases(3)
+
+    def connect(serial):
+        if serial == "offline":
+            raise ConnectionError("device offline")
+        return FakeDevice([""], serial=serial)
+
+    def run_case(d, app, prompt, ctx):
+        if prompt.endswith("1"):
+            raise RuntimeError("plan failed")
+        return "NOT_FOUND"
+
+    report = batch_runner.run_suite(cases, ["offline", "emulator-1"], connect=connect, run_case=run_case)
+
+    assert [r.serial for r in report.results] == ["emulator-1"] * 3
+    assert report.results[1].error == "RuntimeError: plan failed"
+    assert report.passed == 0
+
+def test_cases_without_any_device_are_marked_unavailable():
+    def connect(serial):
+        raise ConnectionError("no adb")
+
+    report = batch_runner.run_suite(_cases(2), ["emulator-1"], connect=connect, run_case=lambda *args: None)
+
+    assert [r.error for r in report.results] == ["No device available"] * 2
@@ -0,0 +1,43 @@
+import pytest
+from source import device_manager, plan_executor
+from source.memory_state import RunContext
+from source.plan_executor import execute_plan
+from tests.fakes import FakeDevice, hierarchy, node
+
+def screen(*nodes):
+    return hierarchy(node(bounds=(0, 0, 1080, 2400), class_name="android.widget.FrameLayout", children="".join(nodes)))
+
+HOME = screen(node("Where to?", (0, 300, 1080, 400), resource_id="com.ubercab:id/search", clickable=True))
+RIDES = screen(node("Moto", (150, 340, 600, 400), resource_id="com.ubercab:id/ride", clickable=True))
+
+@pytest.fixture(autouse=True)
+def _no_settle_waits(monkeypatch):
+    monkeypatch.setattr(device_manager, "wait_for_idle", lambda *args, **kwargs: None)
+    monkeypatch.setattr(plan_executor, "wait_for_idle", lambda *args, **kwargs: None)
+    monkeypatch.setattr(plan_executor, "SCREEN_GRAPH_ENABLED", False)
+    monkeypatch.setattr(plan_executor, "take_screenshot", lambda *args, **kwargs: None)
+
+def test_action_fallback_is_told_what_the_previous_step_changed(monkeypatch):
+    calls = []
+    monkeypatch.setattr(plan_executor, "gpt_fallback_action", lambda *args, **kwargs: calls.append(kwargs))
+    d = FakeDevice([HOME, RIDES])
+    ctx = RunContext()
+    ctx.current_plan = [{"action": "click", "target": "text='Where to?'"},
+                        {"action": "click", "target": "text='Uber Go'"}]
+
+    execute_plan(d, ctx)
+
+    changes = calls[0]["screen_changes"]
+    assert changes.startswith("Screen changes since step 1 (+1 -1 ~0)")
+    assert "+ TextView 'Moto' ride" in changes and "- TextView 'Where to?' search" in changes
+
+def test_unchanged_screen_is_reported_as_such(monkeypatch):
+    calls = []
+    monkeypatch.setattr(plan_executor, "gpt_fallback_action", lambda *args, **kwargs: calls.append(kwargs))
+    ctx = RunContext()
+    ctx.current_plan = [{"action": "click", "target": "text='Where to?'"},
+                        {"action": "click", "target": "text='Uber Go'"}]
+
+    execute_plan(FakeDevice([HOME]), ctx)
+
+    assert calls[0]["screen_changes"] == "The screen did not change after step 1."
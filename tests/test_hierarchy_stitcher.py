@@ -0,0 +1,67 @@
+from source.filter_ui_elements import parse_ui_nodes
+from source.hierarchy_stitcher import HierarchyStitcher, stitch_pages
+from tests.fakes import hierarchy, node
+
+TOP, BOTTOM, ROW = 300, 2100, 200
+RIDES = [(f"Ride {i}", f"₹{100 + i * 15}") for i in range(20)]
+
+def page(scroll):
+    """Parsed dump of the ride list scrolled down by `scroll` pixels; rows are clipped at the container edges."""
+    rows = ""
+    for i, (name, price) in enumerate(RIDES):
+        y = TOP + i * ROW - scroll
+        y1, y2 = max(y, TOP), min(y + ROW - 20, BOTTOM)
+        if y2 <= y1:
+            continue
+        cells = ""
+        for text, (x1, x2), rid in ((name, (150, 600), "label"), (price, (800, 1050), "price")):
+            c1, c2 = max(y + 40, TOP), min(y + 100, BOTTOM)
+            if c2 > c1:
+                cells += node(text, (x1, c1, x2, c2), resource_id=f"com.example:id/{rid}")
+        rows += node(bounds=(0, y1, 1080, y2), class_name="android.view.ViewGroup", children=cells)
+    return parse_ui_nodes(hierarchy(
+        node("Choose a ride", (0, 100, 1080, 200)),
+        node(bounds=(0, TOP, 1080, BOTTOM), class_name="androidx.recyclerview.widget.RecyclerView",
+             children=rows, scrollable=True),
+        node("Confirm", (0, 2200, 1080, 2350), clickable=True),
+    ))
+
+def _texts(stitcher):
+    return [n.text for n in stitcher.nodes if n.text]
+
+def test_overlapping_pages_are_merged_without_duplicates():
+    stitcher = HierarchyStitcher()
+    for scroll in (0, 700, 1400, 2180):  # consecutive pages overlap by several rows
+        stitcher.add_page(page(scroll))
+
+    texts = _texts(stitcher)
+    assert len(texts) == len(set(texts))
+    names = [text for text in texts if text.startswith("Ride ")]
+    assert names == [name for name, _ in RIDES]
+    # Fixed header stays on top, the bottom button moves below the last row
+    assert texts[0] == "Choose a ride" and texts[-1] == "Confirm"
+
+def test_rows_keep_their_list_positions():
+    stitcher = HierarchyStitcher()
+    stitcher.add_page(page(0))
+    stitcher.add_page(page(900))
+
+    bounds = {n.text: n.bounds for n in stitcher.nodes if n.text.startswith("Ride ")}
+    assert bounds["Ride 10"][1] - bounds["Ride 0"][1] == 10 * ROW
+
+def test_stitch_pages_stops_when_scroll_reports_the_end():
+    offsets = iter((900, 2180))
+    swipes = []
+
+    def scroll(d, turn, nodes=None):
+        swipes.append(turn)
+        offset = next(offsets, None)
+        return None if offset is None else page(offset)
+
+    stitcher = HierarchyStitcher()
+    stitcher.add_page(page(0))
+    added = list(stitch_pages(None, stitcher, scroll, max_scrolls=5))
+
+    assert swipes == [0, 1, 2]
+    assert stitcher.scrolls == 2 and len(added) == 2
+    assert [text for text in _texts(stitcher) if text.startswith("Ride ")] == [name for name, _ in RIDES]
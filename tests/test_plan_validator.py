@@ -0,0 +1,20 @@
+from source.hierarchy_store import HierarchySnapshotStore
+from source.plan_validator import check_against_screen
+from tests.fakes import hierarchy, node
+
+def snapshot():
+    store = HierarchySnapshotStore()
+    store.record(hierarchy(node(bounds=(0, 0, 1080, 2400), children=node("Where to?", (0, 300, 1080, 400), clickable=True))))
+    return store.latest
+
+def test_opening_click_missing_from_the_screen_is_flagged():
+    plan = [{"action": "click", "target": "text='Uber Go'"}, {"action": "wait", "target": "text='Confirm'"}]
+
+    issues, fixed = check_against_screen(plan, snapshot())
+
+    assert [issue.index for issue in issues] == [0] and fixed == 0
+
+def test_clicks_after_a_wait_are_not_checked_against_the_launch_screen():
+    plan = [{"action": "wait", "target": "text='Choose a ride'"}, {"action": "click", "target": "text='Uber Go'"}]
+
+    assert check_against_screen(plan, snapshot()) == ([], 0)
@@ -0,0 +1,79 @@
+import pytest
+from source import device_manager, plan_executor
+from source.executor import replay_automation
+from source.memory_state import RunContext
+from source.plan_executor import execute_plan
+from source.plan_trace import PlanTrace
+from tests.fakes import FakeDevice, hierarchy, node
+
+def screen(*nodes):
+    return hierarchy(node(bounds=(0, 0, 1080, 2400), class_name="android.widget.FrameLayout", children="".join(nodes)))
+
+RIDES_SCREEN = screen(
+    node("Choose a ride", (0, 100, 1080, 200)),
+    node(bounds=(0, 300, 1080, 500), class_name="android.view.ViewGroup", clickable=True, children=(
+        node("Uber Go", (150, 340, 600, 400), clickable=True)
+        + node("₹310", (800, 340, 1050, 400))
+    )),
+)
+SEDAN_SCREEN = screen(
+    node("Choose a ride", (0, 100, 1080, 200)),
+    node(bounds=(0, 300, 1080, 500), class_name="android.view.ViewGroup", clickable=True, children=(
+        node("Uber Go Sedan", (150, 340, 600, 400), clickable=True)
+        + node("₹999", (800, 340, 1050, 400))
+    )),
+)
+HOME_SCREEN = screen(node("Where to?", (0, 300, 1080, 400), clickable=True))
+
+TRACE = PlanTrace(
+    app="uber",
+    package="com.ubercab",
+    user_request="price of Uber Go",
+    steps=[
+        {"action": "click", "target": "text='Uber Go'"},
+        {"action": "extract", "query": "price of Uber Go", "answer": "₹250"},
+    ],
+    result="₹250",
+)
+
+@pytest.fixture(autouse=True)
+def _no_settle_waits(monkeypatch):
+    """Screens are static here, so every settle falls back to a single dump."""
+    monkeypatch.setattr(device_manager, "wait_for_idle", lambda *args, **kwargs: None)
+    monkeypatch.setattr(plan_executor, "wait_for_idle", lambda *args, **kwargs: None)
+    monkeypatch.setattr(plan_executor, "SCREEN_GRAPH_ENABLED", False)
+
+def test_broken_route_returns_none_instead_of_the_recorded_answer():
+    d = FakeDevice([HOME_SCREEN])
+
+    assert replay_automation(d, TRACE, verbose=False) is None
+    assert d.clicks == []
+
+def test_recorded_click_is_not_fuzzily_matched_to_another_element():
+    d = FakeDevice([SEDAN_SCREEN])
+
+    assert replay_automation(d, TRACE, verbose=False) is None
+    assert d.clicks == []
+
+def test_executed_steps_record_the_selector_a_local_match_clicked():
+    d = FakeDevice([SEDAN_SCREEN])
+    ctx = RunContext(current_package="com.ubercab")
+    ctx.current_plan = [{"action": "click", "target": "text='Uber Go'"}]
+
+    execute_plan(d, ctx)
+
+    assert len(d.clicks) == 1
+    assert ctx.executed_steps == [{"action": "click", "target": "text='Uber Go Sedan'"}]
+
+def test_extract_reads_the_live_screen():
+    d = FakeDevice([RIDES_SCREEN])
+
+    assert replay_automation(d, TRACE, verbose=False) == "₹310"
+    assert len(d.clicks) == 1
+
+def test_given_context_gets_llm_calls_back_after_replay():
+    ctx = RunContext()
+
+    replay_automation(FakeDevice([HOME_SCREEN]), TRACE, verbose=False, ctx=ctx)
+
+    assert ctx.llm_enabled
@@ -0,0 +1,39 @@
+import functools
+from source import plan_executor, ui_idle
+from source.filter_ui_elements import parse_ui_nodes
+from source.hierarchy_store import screen_fingerprint
+from source.memory_state import RunContext
+from source.plan_executor import execute_plan
+from tests.fakes import FakeClock, FakeDevice, hierarchy, node
+
+def screen(*nodes):
+    return hierarchy(node(bounds=(0, 0, 1080, 2400), class_name="android.widget.FrameLayout", children="".join(nodes)))
+
+HOME = screen(node("Where to?", (0, 300, 1080, 400), resource_id="com.ubercab:id/search", clickable=True))
+LOADING = screen(node(bounds=(490, 1150, 590, 1250), class_name="android.widget.ProgressBar"))
+RIDES = screen(node("Uber Go", (150, 340, 600, 400), resource_id="com.ubercab:id/ride", clickable=True))
+
+class RecordingGraph:
+    def __init__(self):
+        self.transitions = []
+
+    def record_transition(self, before, steps, after, user_request=None):
+        self.transitions.append((before, steps, after))
+
+def test_transition_is_recorded_to_the_settled_screen(monkeypatch):
+    clock = FakeClock()
+    graph = RecordingGraph()
+    monkeypatch.setattr(plan_executor, "SCREEN_GRAPH_ENABLED", True)
+    monkeypatch.setattr(plan_executor, "get_screen_graph", lambda package: graph)
+    monkeypatch.setattr(plan_executor, "wait_for_idle",
+                        functools.partial(ui_idle.wait_for_idle, clock=clock, sleep=clock.sleep))
+    # The click opens a spinner for one poll before the ride list renders
+    d = FakeDevice([HOME, LOADING, RIDES])
+    ctx = RunContext(current_package="com.ubercab")
+    ctx.current_plan = [{"action": "click", "target": "text='Where to?'"}]
+
+    execute_plan(d, ctx)
+
+    step = {"action": "click", "target": "text='Where to?'"}
+    fingerprint = lambda xml: screen_fingerprint(parse_ui_nodes(xml))
+    assert graph.transitions == [(None, [step], fingerprint(RIDES))]
@@ -0,0 +1,52 @@
+import io
+import pytest
+from source.filter_ui_elements import parse_ui_nodes
+from source.screenshot_manager import FrameAnswerCache, frame_key, is_near_duplicate
+from tests.fakes import hierarchy, node
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+ROW = 220
+
+def ride_list(scroll=0, clock="12:00", cursor=False):
+    """JPEG of a uniform ride list scrolled by `scroll` pixels, with a status bar clock."""
+    image = Image.new("RGB", (1080, 2400), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 1080, 80), fill="black")
+    draw.text((40, 20), clock, fill="white")
+    for i in range(30):
+        y = 200 + i * ROW - scroll
+        draw.rectangle((40, y, 1040, y + 200), outline="gray", width=4)
+        draw.rectangle((80, y + 50, 400, y + 110), fill="black")
+    if cursor:
+        draw.line((520, 2300, 520, 2340), fill="black", width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+def ride_nodes(scroll=0, clock="12:00"):
+    """Hierarchy of the same screen; the status bar clock is the only node above y=96."""
+    labels = ((i, 250 + i * ROW - scroll) for i in range(30))
+    rows = "".join(node(f"Ride {i}", (80, y, 400, y + 60)) for i, y in labels if 200 <= y and y + 60 <= 2400)
+    return parse_ui_nodes(hierarchy(node(bounds=(0, 0, 1080, 2400), children=node(clock, (40, 20, 200, 60)) + rows)))
+
+def test_status_bar_and_cursor_changes_keep_the_frame_key():
+    key = frame_key(ride_list(), ride_nodes())
+    assert is_near_duplicate(key, frame_key(ride_list(clock="12:01"), ride_nodes(clock="12:01")))
+    assert is_near_duplicate(key, frame_key(ride_list(clock="12:01", cursor=True), ride_nodes(clock="12:01")))
+
+def test_scrolled_uniform_list_gets_a_different_key():
+    # A whole number of identical rows scrolled by looks the same at hash resolution...
+    unchanged, scrolled = frame_key(ride_list()), frame_key(ride_list(scroll=5 * ROW))
+    assert is_near_duplicate(unchanged, scrolled)
+    # ...but the hierarchy shows other rows
+    assert not is_near_duplicate(frame_key(ride_list(), ride_nodes()),
+                                 frame_key(ride_list(scroll=5 * ROW), ride_nodes(scroll=5 * ROW)))
+
+def test_answer_cache_matches_near_duplicate_frames_only():
+    cache = FrameAnswerCache()
+    cache.put("Price of Ride 3", frame_key(ride_list(), ride_nodes()), "₹145")
+
+    assert cache.get("price of  ride 3", frame_key(ride_list(clock="12:05"), ride_nodes(clock="12:05"))) == (True, "₹145")
+    assert cache.get("price of ride 3", frame_key(ride_list(scroll=5 * ROW), ride_nodes(scroll=5 * ROW))) == (False, None)
@@ -0,0 +1,35 @@
+import pytest
+from source import scroll_planner as planner_module
+from source.filter_ui_elements import parse_ui_nodes
+from source.scroll_planner import ScrollPlanner
+from tests.fakes import FakeDevice, hierarchy, node
+
+def page(first):
+    """Ride list showing rows first..first+4"""
+    rows = "".join(node(f"Ride {i}", (150, 300 + (i - first) * 300, 1050, 500 + (i - first) * 300))
+                   for i in range(first, first + 5))
+    return hierarchy(node(bounds=(0, 0, 1080, 2400), children=node(
+        bounds=(0, 300, 1080, 1800), class_name="androidx.recyclerview.widget.RecyclerView",
+        scrollable=True, children=rows)))
+
+@pytest.fixture(autouse=True)
+def _no_settle_waits(monkeypatch):
+    monkeypatch.setattr(planner_module, "wait_for_idle", lambda *args, **kwargs: None)
+
+def test_swipe_is_planned_from_the_nodes_the_caller_passes():
+    d = FakeDevice([page(5)])
+
+    after = ScrollPlanner().scroll(d, 1, nodes=parse_ui_nodes(page(0)))
+
+    assert d.dump_count == 1  # only the settled page
+    assert [n.text for n in after if n.text][0] == "Ride 5"
+
+def test_swipe_without_nodes_reads_the_screen_instead_of_an_earlier_swipe():
+    # The caller scrolled once, then the screen changed without another swipe through the planner
+    d = FakeDevice([page(0), page(5), page(10), page(10)])
+    planner = ScrollPlanner()
+    planner.scroll(d, 0)
+
+    # Comparing against the fresh dump shows the list did not move
+    assert planner.scroll(d, 1) is None
+    assert len(d.swipes) == 2
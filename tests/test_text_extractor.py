@@ -0,0 +1,29 @@
+from source.filter_ui_elements import parse_ui_nodes
+from source.text_extractor import match_on_screen
+from tests.fakes import hierarchy, node
+
+def rides(*labels):
+    """Parsed ride list with one label per row."""
+    rows = "".join(node(bounds=(0, 300 + i * 200, 1080, 480 + i * 200), class_name="android.view.ViewGroup",
+                        children=node(label, (150, 340 + i * 200, 1050, 400 + i * 200)))
+                   for i, label in enumerate(labels))
+    return parse_ui_nodes(hierarchy(node(bounds=(0, 0, 1080, 2400), children=rows)))
+
+def test_regex_tier_takes_the_best_label_not_the_first():
+    # Both labels pass the minimum score; the exact one comes second
+    found = match_on_screen(rides("Uber Go Sedans ₹480", "Uber Go Sedan ₹450"), ("currency",), "uber go sedan")
+
+    assert (found.answer, found.tier) == ("₹450", "regex")
+
+def test_regex_tier_refuses_near_ties():
+    assert match_on_screen(rides("Uber Go ₹310", "Uber Go Sedan ₹450"), ("currency",), "uber go") is None
+
+def test_semantic_tier_reads_the_value_from_its_row():
+    nodes = parse_ui_nodes(hierarchy(node(bounds=(0, 0, 1080, 2400), children="".join(
+        node(bounds=(0, y, 1080, y + 180), class_name="android.view.ViewGroup",
+             children=node(name, (150, y + 40, 600, y + 100)) + node(price, (800, y + 40, 1050, y + 100)))
+        for y, name, price in ((300, "Uber Go", "₹310"), (500, "Moto", "₹90"))))))
+
+    found = match_on_screen(nodes, ("currency",), "moto")
+
+    assert (found.answer, found.tier) == ("₹90", "semantic")
@@ -0,0 +1,36 @@
+from source.ui_idle import wait_for_idle
+from tests.fakes import FakeClock, FakeDevice, hierarchy, node
+
+LOADING = hierarchy(node("Loading..."))
+LOADED = hierarchy(node("Uber Go ₹250"))
+
+def test_returns_settled_dump_once_polls_repeat():
+    clock = FakeClock()
+    d = FakeDevice([LOADING, hierarchy(node("Uber Go")), LOADED])
+
+    xml = wait_for_idle(d, timeout=5.0, stable_polls=3, interval=0.3, clock=clock, sleep=clock.sleep)
+
+    assert xml == LOADED
+    # Two changing polls, then three identical ones
+    assert d.dump_count == 5
+    assert clock.now <= 5.0
+
+def test_returns_none_when_screen_never_settles():
+    clock = FakeClock()
+    d = FakeDevice([hierarchy(node(f"Frame {i}")) for i in range(100)])
+
+    xml = wait_for_idle(d, timeout=1.0, stable_polls=2, interval=0.3, clock=clock, sleep=clock.sleep)
+
+    assert xml is None
+    assert clock.now <= 1.0
+    assert d.dump_count == len(clock.sleeps) + 1
+
+def test_require_holds_off_settling_until_predicate_matches():
+    clock = FakeClock()
+    d = FakeDevice([LOADING, LOADING, LOADING, LOADED])
+
+    xml = wait_for_idle(d, timeout=5.0, stable_polls=2, interval=0.3, require=lambda xml: "₹" in xml,
+                        clock=clock, sleep=clock.sleep)
+
+    assert xml == LOADED
+    assert d.dump_count == 5